@@ -1,14 +1,17 @@
 """
 CodEyeEngine.py - Core engine for the CodEye package.
 
-This module provides the CodeEyeEngine class, which is responsible for analyzing codebases and generating architectural overviews using a specified language model (LLM). It includes methods for formatting markdown output, counting files in a prompt, and describing a codebase. Handles chunking, LLM invocation, and output conversion to files, PDF, and HTML.
+This module provides the CodeEyeEngine class, which is responsible for analyzing codebases and generating architectural overviews using a specified language model (LLM). It includes methods for formatting markdown output and describing a codebase. Handles chunking, LLM invocation, and output conversion to files, PDF, and HTML.
 
 Classes:
     CodeEyeEngine: Main engine for codebase analysis and LLM interaction.
 
 Functions:
-    estimate_token_count(text: str) -> int: Estimate token count for a string.
-    chunk_files_for_token_limit(filepaths, max_tokens, directory_path): Chunk files for LLM token limits.
+    estimate_token_count(text: Union[str, int], model=None) -> int: Count tokens for a string, or estimate them from a length.
+    estimate_token_count_for_file(abs_path, size=None, model=None) -> int: Count (or estimate) the tokens of a file.
+    chunk_files_for_token_limit(file_info, max_tokens): Chunk files for LLM token limits.
+    build_documents_prompt(directory_path, rel_paths, texts=None) -> Tuple[str, int]: Build a chunk prompt in <documents> XML format.
+    condense_chunk_output(text, max_tokens=2000, model=None) -> str: Condense chunk output into bounded context for the next chunk.
 
 Typical usage example:
     engine = CodeEyeEngine(system_prompt="...", model="gemini-2.5-pro")
@@ -32,39 +35,436 @@ import os
 import subprocess
 import re
 import logging
-import math
-from typing import Optional, Tuple
+import functools
+import hashlib
+import threading
+import asyncio
+import fnmatch
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple, Union
 from md_to_files import Md2FilesConvertor
 from md_to_pdf import md_to_pdf
 
-def estimate_token_count(text: str) -> int:
-    # Rough estimate: 1 token ≈ 4 characters (for code, this is conservative)
-    return math.ceil(len(text) / 4)
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
 
-def chunk_files_for_token_limit(filepaths, max_tokens, directory_path):
+# A whitespace-only line followed by one or more further whitespace-only lines.
+# Substituting the first line back in keeps exactly one blank line per run.
+_BLANK_RUN_RE = re.compile(r'^([^\S\n]*)(?:\n[^\S\n]*(?=\n|\Z))+', re.MULTILINE)
+
+@functools.lru_cache(maxsize=8)
+def _get_encoding(model: Optional[str] = None):
+    """
+    Returns the tiktoken encoding for model, or cl100k_base for models tiktoken does not know
+    (e.g. Gemini or Claude). Encodings are expensive to build, so one is kept per model.
+    Returns None if tiktoken is not installed or the encoding cannot be loaded (tiktoken
+    downloads encoding files on first use, which fails offline).
+    """
+    if tiktoken is None:
+        return None
+    try:
+        if model:
+            try:
+                return tiktoken.encoding_for_model(model)
+            except KeyError:
+                pass
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logging.warning(f"tiktoken encoding unavailable, falling back to estimated token counts: {e}")
+        return None
+
+def estimate_token_count(text: Union[str, int], model: Optional[str] = None) -> int:
+    """
+    Counts the tokens in text with tiktoken when it is available.
+    Without tiktoken, or when only a precomputed length (e.g. a file size in bytes) is given,
+    falls back to the rough estimate of 1 token ≈ 4 characters.
+    """
+    if isinstance(text, str):
+        encoding = _get_encoding(model)
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=()))
+    length = text if isinstance(text, int) else len(text)
+    # Integer ceil(length / 4) without a float round-trip
+    return (length + 3) >> 2
+
+def estimate_token_count_for_file(abs_path: str, size: Optional[int] = None, model: Optional[str] = None) -> int:
+    """
+    Counts the tokens of a file with tiktoken when it is available. Otherwise the count is estimated
+    from the size in bytes without reading the file; bytes ≈ characters for source code.
+    Pass size when a stat result is already at hand.
+    """
+    if size is None:
+        size = os.path.getsize(abs_path)
+    if _get_encoding(model) is not None:
+        try:
+            with open(abs_path, 'r', encoding='utf-8') as f:
+                return estimate_token_count(f.read(), model)
+        except (UnicodeDecodeError, OSError):
+            # Binary or unreadable files are left out of the prompt anyway
+            pass
+    return estimate_token_count(size)
+
+# Per-file token counts keyed by (abs_path, size, mtime_ns, model), so an edited file misses
+# the cache while an unchanged one never gets re-read or re-tokenized for sizing
+_FILE_TOKENS = {}
+_FILE_TOKENS_MAX = 4096
+
+# Directories that never hold source worth analyzing; they are pruned before descending
+DEFAULT_EXCLUDED_DIRS = frozenset({
+    '.git', 'node_modules', '__pycache__', '.venv', 'venv', 'dist', 'build', '.mypy_cache', '.pytest_cache'
+})
+
+def _gitignore_pattern_re(pattern):
+    """
+    Translates one .gitignore glob (without a leading '!' or trailing '/') into a regex over
+    '/'-separated paths relative to the directory holding the .gitignore. As in git, a pattern
+    containing a '/' is anchored to that directory, while any other pattern matches at any depth.
     """
-    Splits the list of files into chunks such that the total estimated tokens per chunk does not exceed max_tokens.
-    Returns a list of lists of filepaths.
+    anchored = '/' in pattern
+    pattern = pattern.lstrip('/')
+    parts = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            parts.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('**', i) and i + 2 == len(pattern):
+            parts.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            parts.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            parts.append('[^/]')
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 2:]:
+            close = pattern.index(']', i + 2)
+            body = pattern[i + 1:close]
+            if body.startswith('!'):
+                body = '^' + body[1:]
+            parts.append('[' + body.replace('\\', '\\\\') + ']')
+            i = close + 1
+        else:
+            if pattern[i] == '\\' and i + 1 < len(pattern):
+                i += 1
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return re.compile(('' if anchored else '(?:.*/)?') + ''.join(parts))
+
+def _read_gitignore(directory_path, rel_dir):
+    """
+    Parses the .gitignore in directory_path/rel_dir, if any, into a (rel_dir, rules) pair where each
+    rule is a (regex, negated, dir_only) tuple. Returns None if the directory has no .gitignore.
+    """
+    gitignore_path = os.path.join(directory_path, rel_dir, '.gitignore')
+    if not os.path.isfile(gitignore_path):
+        return None
+    rules = []
+    try:
+        with open(gitignore_path, 'r', encoding='utf-8', errors='ignore') as f:
+            lines = f.read().splitlines()
+    except OSError as e:
+        logging.warning(f"Could not read {gitignore_path}, its rules are not applied: {e}")
+        return None
+    for line in lines:
+        line = line.rstrip()
+        if not line or line.startswith('#'):
+            continue
+        negated = line.startswith('!')
+        if negated:
+            line = line[1:]
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        if line:
+            rules.append((_gitignore_pattern_re(line), negated, dir_only))
+    return (rel_dir.replace(os.sep, '/'), rules)
+
+def _is_gitignored(gitignore_rules, rel_path, is_dir):
+    """
+    Checks rel_path against the rules of every .gitignore from the scanned root down to the
+    entry's directory. As in git, the last matching rule wins, so deeper .gitignore files and
+    later '!' lines override earlier rules.
     """
+    rel_path = rel_path.replace(os.sep, '/')
+    ignored = False
+    for base, rules in gitignore_rules:
+        sub_path = rel_path[len(base) + 1:] if base else rel_path
+        for regex, negated, dir_only in rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.fullmatch(sub_path):
+                ignored = not negated
+    return ignored
+
+def _iter_files(directory_path, exclude_re=None, gitignore_rules=None, _rel_dir=""):
+    """
+    Recursively yields (rel_path, DirEntry) for every regular file under directory_path.
+    Uses os.scandir so the file type comes from the directory listing instead of a stat() per file.
+    Hidden entries, directories in DEFAULT_EXCLUDED_DIRS, names matching exclude_re and paths
+    ignored by a .gitignore are skipped without descending into them. .gitignore files are read
+    in every directory, the way git does; pass gitignore_rules=None to disregard them.
+    """
+    if gitignore_rules is not None:
+        local_rules = _read_gitignore(directory_path, _rel_dir)
+        if local_rules is not None:
+            gitignore_rules = gitignore_rules + (local_rules,)
+    with os.scandir(os.path.join(directory_path, _rel_dir)) as it:
+        for entry in it:
+            # Hidden files and directories are left out, as files-to-prompt does by default
+            if entry.name.startswith('.'):
+                continue
+            if exclude_re is not None and exclude_re.match(entry.name):
+                continue
+            rel_path = os.path.join(_rel_dir, entry.name) if _rel_dir else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name in DEFAULT_EXCLUDED_DIRS:
+                    continue
+                if gitignore_rules and _is_gitignored(gitignore_rules, rel_path, True):
+                    continue
+                yield from _iter_files(directory_path, exclude_re, gitignore_rules, rel_path)
+            elif entry.is_file(follow_symlinks=False):
+                if gitignore_rules and _is_gitignored(gitignore_rules, rel_path, False):
+                    continue
+                yield rel_path, entry
+
+def _stat_and_estimate(entry, model=None):
+    """
+    Returns (size_in_bytes, estimated_tokens, text) for a DirEntry, or None if it can no longer be stat'ed.
+    text is the file content when it had to be read to count its tokens (tiktoken installed and no
+    cached count), so build_documents_prompt can use it instead of reading the file again; otherwise None.
+    """
+    try:
+        st = entry.stat(follow_symlinks=False)
+    except OSError:
+        return None
+    key = (entry.path, st.st_size, st.st_mtime_ns, model)
+    tokens = _FILE_TOKENS.get(key)
+    if tokens is not None:
+        return st.st_size, tokens, None
+    text = None
+    if _get_encoding(model) is not None:
+        try:
+            with open(entry.path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except (UnicodeDecodeError, OSError):
+            # Binary or unreadable files are left out of the prompt anyway
+            pass
+    tokens = estimate_token_count(st.st_size if text is None else text, model)
+    if len(_FILE_TOKENS) < _FILE_TOKENS_MAX:
+        _FILE_TOKENS[key] = tokens
+    return st.st_size, tokens, text
+
+def _top_level_dir(rel_path):
+    """Returns the first path component of rel_path, or '' for files at the root."""
+    head, sep, _ = rel_path.partition(os.sep)
+    return head if sep else ''
+
+def chunk_files_for_token_limit(file_info, max_tokens):
+    """
+    Splits the files into chunks such that the total estimated tokens per chunk does not exceed max_tokens.
+    file_info maps each relative filepath to a (size_in_bytes, estimated_tokens) tuple, so no file is read here.
+    Files are grouped by top-level directory and packed best-fit decreasing: each file, largest first,
+    goes into the fullest chunk it still fits in, preferring chunks that already hold files from the
+    same directory. This keeps related files together and fills chunks evenly.
+    Returns a tuple (chunks, total_tokens) where chunks is a list of lists of filepaths.
+    A single chunk means the whole codebase fits within max_tokens.
+    """
+    ordered = sorted(
+        file_info.items(),
+        key=lambda item: (_top_level_dir(item[0]), -item[1][1], item[0])
+    )
     chunks = []
-    current_chunk = []
-    current_tokens = 0
-    for filepath in filepaths:
-        abs_path = os.path.join(directory_path, filepath)
-        if not os.path.isfile(abs_path):
+    chunk_dirs = []
+    chunk_tokens = []
+    total_tokens = 0
+    for filepath, (_, tokens) in ordered:
+        total_tokens += tokens
+        top_dir = _top_level_dir(filepath)
+        best = None
+        best_key = None
+        for idx, used in enumerate(chunk_tokens):
+            if used + tokens > max_tokens:
+                continue
+            key = (top_dir not in chunk_dirs[idx], max_tokens - used - tokens)
+            if best_key is None or key < best_key:
+                best, best_key = idx, key
+        if best is None:
+            # Nothing fits (files larger than max_tokens always end up here): open a new chunk
+            chunks.append([])
+            chunk_dirs.append(set())
+            chunk_tokens.append(0)
+            best = len(chunks) - 1
+        chunks[best].append(filepath)
+        chunk_dirs[best].add(top_dir)
+        chunk_tokens[best] += tokens
+    for chunk in chunks:
+        chunk.sort()
+    return chunks, total_tokens
+
+def _read_source_file(abs_path):
+    """
+    Reads a file as UTF-8 text for the prompt. Returns None for binary (undecodable) or unreadable files,
+    which are left out of the prompt.
+    """
+    try:
+        with open(abs_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except (UnicodeDecodeError, OSError) as e:
+        logging.warning(f"Skipping {abs_path}: {e}")
+        return None
+
+def build_documents_prompt(directory_path, rel_paths, texts=None):
+    """
+    Builds the prompt for a chunk of files in the <documents>/<document> XML layout used by files-to-prompt --cxml.
+    texts optionally maps relative paths to content already read while sizing the files; those entries are
+    used and removed from it, so their memory is released once the chunk is built. The remaining files are
+    read concurrently; files that cannot be decoded as UTF-8 are skipped.
+    Returns a tuple (prompt_content, file_count).
+    """
+    contents = [texts.pop(rel_path, None) for rel_path in rel_paths] if texts else [None] * len(rel_paths)
+    to_read = [idx for idx, content in enumerate(contents) if content is None]
+    if to_read:
+        abs_paths = [os.path.join(directory_path, rel_paths[idx]) for idx in to_read]
+        max_workers = min(32, (os.cpu_count() or 1) * 4, len(abs_paths))
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for idx, content in zip(to_read, pool.map(_read_source_file, abs_paths)):
+                contents[idx] = content
+    parts = ["<documents>"]
+    file_count = 0
+    for rel_path, content in zip(rel_paths, contents):
+        if content is None:
+            continue
+        file_count += 1
+        parts.append(
+            f'<document index="{file_count}">\n<source>{rel_path}</source>\n'
+            f'<document_content>\n{content}\n</document_content>\n</document>'
+        )
+    parts.append("</documents>")
+    return '\n'.join(parts), file_count
+
+# Upper bound (in estimated tokens) for the context carried from earlier chunks into the next one
+CONTEXT_SUMMARY_TOKENS = 2000
+
+def condense_chunk_output(text: str, max_tokens: int = CONTEXT_SUMMARY_TOKENS, model: Optional[str] = None) -> str:
+    """
+    Condenses LLM output into a bounded summary to use as context for the next chunk.
+    Text that already fits is returned unchanged. Otherwise only markdown headings, the first
+    sentence after each heading, and the opening fence plus file path comment of each code block
+    are kept. If that is still too long (or there is no such structure), the most recent part is kept.
+    """
+    if estimate_token_count(text, model) <= max_tokens:
+        return text
+    kept = []
+    in_fence = False
+    fence_header = None
+    want_sentence = False
+    for line in text.split('\n'):
+        stripped = line.strip()
+        if stripped.startswith('```'):
+            in_fence = not in_fence
+            fence_header = stripped if in_fence else None
             continue
-        with open(abs_path, 'r', encoding='utf-8', errors='ignore') as f:
-            content = f.read()
-        tokens = estimate_token_count(content)
-        if current_tokens + tokens > max_tokens and current_chunk:
-            chunks.append(current_chunk)
-            current_chunk = []
-            current_tokens = 0
-        current_chunk.append(filepath)
-        current_tokens += tokens
-    if current_chunk:
-        chunks.append(current_chunk)
-    return chunks
+        if in_fence:
+            if fence_header is not None and stripped.startswith('#'):
+                kept.extend((fence_header, stripped, '```'))
+            fence_header = None
+            continue
+        if stripped.startswith('#'):
+            kept.append(stripped)
+            want_sentence = True
+        elif stripped and want_sentence:
+            kept.append(stripped.split('. ', 1)[0].rstrip('.') + '.')
+            want_sentence = False
+    # Unstructured output has nothing to condense, so fall back to its most recent part
+    summary = '\n'.join(kept) if kept else text
+    max_chars = max_tokens * 4
+    while len(summary) > max_chars or estimate_token_count(summary, model) > max_tokens:
+        if len(summary) <= max_chars:
+            # Denser than 4 characters per token by tiktoken's count: keep a shorter tail
+            max_chars = len(summary) * 3 // 4
+        summary = summary[-max_chars:] if max_chars else ''
+        # Start at a line boundary, unless that would drop everything
+        newline = summary.find('\n')
+        if newline < len(summary) - 1:
+            summary = summary[newline + 1:]
+    return summary
+
+def _write_text_file(path, content):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+_STDIN_WRITE_SIZE = 64 * 1024
+
+def _run_llm_process(llm_cmd, prompt_parts):
+    """
+    Runs the llm command, streaming the prompt to its stdin in 64KB slices instead of
+    handing the whole prompt to communicate(). prompt_parts is a list of strings written one
+    after another, so a context prefix never has to be concatenated with the chunk content.
+    stdout and stderr are drained on background threads so a full pipe can never deadlock the writer.
+    Returns a tuple (output, error, return_code).
+    """
+    process = subprocess.Popen(
+        llm_cmd,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True
+    )
+    captured = {}
+
+    def drain(name, stream):
+        captured[name] = stream.read()
+        stream.close()
+
+    readers = [
+        threading.Thread(target=drain, args=(name, stream), daemon=True)
+        for name, stream in (("stdout", process.stdout), ("stderr", process.stderr))
+    ]
+    for reader in readers:
+        reader.start()
+    try:
+        for part in prompt_parts:
+            for start in range(0, len(part), _STDIN_WRITE_SIZE):
+                process.stdin.write(part[start:start + _STDIN_WRITE_SIZE])
+    except BrokenPipeError:
+        # The process exited without reading all of its input; stderr will say why
+        pass
+    try:
+        process.stdin.close()
+    except BrokenPipeError:
+        pass
+    for reader in readers:
+        reader.join()
+    return_code = process.wait()
+    return captured.get("stdout", ""), captured.get("stderr", ""), return_code
+
+async def _run_llm_process_async(llm_cmd, prompt_parts):
+    """
+    asyncio counterpart of _run_llm_process, used when several chunks are sent to the LLM concurrently.
+    Returns a tuple (output, error, return_code).
+    """
+    process = await asyncio.create_subprocess_exec(
+        *llm_cmd,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+
+    async def feed():
+        try:
+            for part in prompt_parts:
+                process.stdin.write(part.encode('utf-8'))
+                await process.stdin.drain()
+            process.stdin.close()
+        except (BrokenPipeError, ConnectionResetError):
+            # The process exited without reading all of its input; stderr will say why
+            pass
+
+    _, output, error = await asyncio.gather(feed(), process.stdout.read(), process.stderr.read())
+    return_code = await process.wait()
+    return output.decode('utf-8', errors='replace'), error.decode('utf-8', errors='replace'), return_code
 
 class CodeEyeEngine:
     """
@@ -76,8 +476,19 @@ class CodeEyeEngine:
         model (str): The LLM model to use.
         ignore_gitignore (bool): Whether to ignore `.gitignore` rules when scanning files.
         exclude_pattern (Optional[str]): Glob pattern to exclude specific files.
+        use_cache (bool): Whether to reuse LLM outputs cached on disk for identical prompts.
+        parallel_chunks (int): How many chunks may be sent to the LLM concurrently.
+        prompt_cache (bool): Whether to pass the provider's prompt caching options to `llm`.
     """
 
+    # Extra `llm` options that turn on provider-side prompt caching. Gemini and OpenAI cache
+    # repeated prompt prefixes implicitly, so only Anthropic (llm-anthropic) needs an explicit marker.
+    # They are only added with prompt_cache=True: models from other plugins, or llm-anthropic versions
+    # without the option, reject unknown options and every chunk would fail.
+    PROMPT_CACHE_OPTIONS = {
+        "claude": ["-o", "cache", "1"],
+    }
+
     def __init__(
         self,
         system_prompt: str = "Provide a detailed architectural overview of the codebase as markdown, and always include an architecture diagram using mermaid syntax as part of the output.",
@@ -85,7 +496,10 @@ class CodeEyeEngine:
         ignore_gitignore: bool = False,
         exclude_pattern: Optional[str] = None,
         provider: str = "gemini",
-        max_tokens: Optional[int] = None
+        max_tokens: Optional[int] = None,
+        use_cache: bool = False,
+        parallel_chunks: int = 1,
+        prompt_cache: bool = False
     ):
         """
         Initializes the CodeEyeEngine instance.
@@ -96,6 +510,11 @@ class CodeEyeEngine:
             ignore_gitignore (bool): Whether to ignore `.gitignore` rules when scanning files.
             exclude_pattern (Optional[str]): Glob pattern to exclude specific files.
             provider (str): LLM provider to use ("gemini", "openai", "claude", or "meta").
+            max_tokens (Optional[int]): Token limit per chunk (default: based on provider/model).
+            use_cache (bool): Whether to reuse LLM outputs cached on disk for identical prompts.
+            parallel_chunks (int): How many chunks may be sent to the LLM concurrently. Values above 1
+                drop the previous-chunk context, since chunks no longer run one after another.
+            prompt_cache (bool): Whether to pass the provider's prompt caching options (PROMPT_CACHE_OPTIONS) to `llm`.
         """
         self.system_prompt = system_prompt
         self.model = model
@@ -103,7 +522,13 @@ class CodeEyeEngine:
         self.exclude_pattern = exclude_pattern
         self.provider = provider
         self.max_tokens = max_tokens
-        logging.info(f"CodeEyeEngine initialized with provider={provider}, model={model}, ignore_gitignore={ignore_gitignore}, exclude_pattern={exclude_pattern}")
+        self.use_cache = use_cache
+        self.parallel_chunks = max(1, parallel_chunks)
+        self.prompt_cache = prompt_cache
+        # Per-chunk prompt/output dumps are debugging aids, so they are only written at DEBUG level
+        self.debug_dump = logging.getLogger().isEnabledFor(logging.DEBUG)
+        self._dump_executor = None
+        logging.info(f"CodeEyeEngine initialized with provider={provider}, model={model}, ignore_gitignore={ignore_gitignore}, exclude_pattern={exclude_pattern}, use_cache={use_cache}")
 
     def format_markdown(self, content: str) -> str:
         """
@@ -115,50 +540,111 @@ class CodeEyeEngine:
         Returns:
             str: The formatted markdown content.
         """
-        lines = content.split('\n')
-        formatted_lines = []
-        prev_blank = False
-        for line in lines:
-            is_blank = not line.strip()
-            if is_blank and prev_blank:
-                continue
-            formatted_lines.append(line)
-            prev_blank = is_blank
-        return '\n'.join(formatted_lines)
+        return _BLANK_RUN_RE.sub(r'\1', content)
 
-    def count_files_in_prompt(self, prompt_text: str) -> int:
+    def _llm_cache_path(self, cache_dir: str, prompt_parts) -> str:
         """
-        Counts the number of files referenced in the given prompt text.
+        Returns the cache file path for a prompt given as a list of parts. The key covers the model,
+        the system prompt and the full prompt content, so any change to one of them misses the cache.
+        """
+        hasher = hashlib.sha256(f"{self.model}\n{self.system_prompt}\n".encode('utf-8'))
+        for part in prompt_parts:
+            hasher.update(part.encode('utf-8'))
+        return os.path.join(cache_dir, f"{hasher.hexdigest()}.md")
 
-        Args:
-            prompt_text (str): The prompt text containing file references.
+    def _build_llm_cmd(self):
+        """
+        Builds the `llm` command line for the configured provider.
+        The system prompt is passed with -s so it stays a stable, cacheable prefix across chunks,
+        while the per-chunk content is sent on stdin as the user message.
+        """
+        llm_cmd = ["llm", "-m", self.model, "-s", self.system_prompt]
+        if self.prompt_cache:
+            llm_cmd.extend(self.PROMPT_CACHE_OPTIONS.get(self.provider, []))
+        return llm_cmd
 
-        Returns:
-            int: The number of files referenced in the prompt text.
+    def _dump_chunk_file(self, path: str, content: str):
         """
-        if "<documents>" in prompt_text:
-            return prompt_text.count("<document ")
-        if not prompt_text.strip():
-            return 0
-        lines = prompt_text.strip().split("\n")
-        count = 0
-        for i in range(len(lines)):
-            line = lines[i]
-            if (i < len(lines) - 1 and
-                "." in line and
-                not line.startswith(" ") and
-                lines[i+1].strip() == "---"):
-                count += 1
-        if count == 0 and "file" in prompt_text:
-            file_pattern = re.compile(r'file\d+\.\w+')
-            count = len(file_pattern.findall(prompt_text))
-        if count == 0 and "file1.txt" in prompt_text and "file2.txt" in prompt_text:
-            count = 2
-        elif count == 0 and "file1.txt" in prompt_text and "file2.txt" in prompt_text and "file3.txt" in prompt_text:
-            count = 3
-        elif count == 0 and "file1.py" in prompt_text and "file2.py" in prompt_text:
-            count = 2
-        return count
+        Writes a chunk prompt/output dump in the background when debug dumps are enabled.
+        A single writer thread keeps the dumps ordered without blocking the chunk loop.
+        """
+        if not self.debug_dump:
+            return
+        if self._dump_executor is None:
+            self._dump_executor = ThreadPoolExecutor(max_workers=1)
+        self._dump_executor.submit(_write_text_file, path, content)
+
+    def _read_llm_cache(self, cache_path: Optional[str]) -> Optional[str]:
+        """
+        Returns the cached LLM output at cache_path, or None if there is no usable entry.
+        """
+        if not cache_path or not os.path.isfile(cache_path):
+            return None
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cached_output = f.read()
+        return cached_output if cached_output.strip() else None
+
+    def _write_llm_cache(self, cache_path: Optional[str], output: str, return_code: int):
+        if cache_path and return_code == 0 and output.strip():
+            _write_text_file(cache_path, output)
+
+    def _invoke_llm(self, chunk_idx: int, llm_cmd, prompt_parts, llm_cache_dir: str):
+        """
+        Runs the LLM for one chunk, given as a list of prompt parts, going through the on-disk cache when enabled.
+        Returns a tuple (output, error, return_code).
+        """
+        cache_path = self._llm_cache_path(llm_cache_dir, prompt_parts) if self.use_cache else None
+        cached_output = self._read_llm_cache(cache_path)
+        if cached_output is not None:
+            logging.info(f"Using cached LLM output for chunk {chunk_idx}: {cache_path}")
+            return cached_output, "", 0
+        logging.info(f"Running LLM command for chunk {chunk_idx}: {' '.join(llm_cmd)}")
+        output, error, return_code = _run_llm_process(llm_cmd, prompt_parts)
+        self._write_llm_cache(cache_path, output, return_code)
+        return output, error, return_code
+
+    async def _invoke_llm_parallel(self, llm_cmd, chunk_prompts, llm_cache_dir: str):
+        """
+        Runs the LLM for several (chunk_idx, prompt_parts) pairs concurrently, at most
+        parallel_chunks at a time. Results are returned in the order of chunk_prompts.
+        """
+        semaphore = asyncio.Semaphore(self.parallel_chunks)
+
+        async def invoke(chunk_idx, prompt_parts):
+            cache_path = self._llm_cache_path(llm_cache_dir, prompt_parts) if self.use_cache else None
+            cached_output = self._read_llm_cache(cache_path)
+            if cached_output is not None:
+                logging.info(f"Using cached LLM output for chunk {chunk_idx}: {cache_path}")
+                return cached_output, "", 0
+            async with semaphore:
+                logging.info(f"Running LLM command for chunk {chunk_idx}: {' '.join(llm_cmd)}")
+                output, error, return_code = await _run_llm_process_async(llm_cmd, prompt_parts)
+            self._write_llm_cache(cache_path, output, return_code)
+            return output, error, return_code
+
+        return await asyncio.gather(*(invoke(chunk_idx, prompt) for chunk_idx, prompt in chunk_prompts))
+
+    def _accept_llm_output(self, chunk_idx: int, output: str, error: str, return_code: int, chunks_dir: str, chunk_errors: list) -> Optional[str]:
+        """
+        Checks one chunk's LLM result and returns the formatted output, or None if the chunk failed.
+        LLM error messages of failed chunks (e.g. an overloaded model) are appended to chunk_errors.
+        """
+        # Save chunk output to file in 'chunks' directory
+        self._dump_chunk_file(os.path.join(chunks_dir, f'chunk_{chunk_idx}_output.txt'), output)
+        if error and return_code != 0:
+            logging.error(f"Error from LLM command: {error.strip()}")
+        elif not output.strip():
+            logging.warning(f"No output generated by LLM for chunk {chunk_idx}. Skipping chunk.")
+        elif return_code != 0:
+            logging.error(f"LLM command failed with return code {return_code} for chunk {chunk_idx}")
+        else:
+            return self.format_markdown(output)
+        for text in (output, error):
+            lower_text = text.lower()
+            if 'model is overloaded' in lower_text or 'error:' in lower_text:
+                chunk_errors.append(text.strip())
+                break
+        return None
 
     def _get_token_limit(self):
         # If explicitly set, use it
@@ -192,144 +678,125 @@ class CodeEyeEngine:
     ) -> Tuple[str, int, int]:
         """
         Analyzes the codebase in the specified directory and generates an architectural overview.
+        Pending chunk dumps are flushed before returning.
         """
+        try:
+            return self._describe_codebase(directory_path, output_file)
+        finally:
+            if self._dump_executor is not None:
+                self._dump_executor.shutdown(wait=True)
+                self._dump_executor = None
+
+    def _describe_codebase(self, directory_path: str, output_file: Optional[str]) -> Tuple[str, int, int]:
         logging.info(f"Describing codebase in directory: {directory_path}")
         if not os.path.isdir(directory_path):
             logging.error(f"Directory does not exist: {directory_path}")
             return f"Error: Directory '{directory_path}' does not exist", 1, 0
 
-        # --- Step 1: Run files-to-prompt ONCE to get content and count ---
-        files_to_prompt_cmd = ["files-to-prompt"]  # Do not include directory_path here
-        if self.ignore_gitignore:
-            files_to_prompt_cmd.append("--ignore-gitignore")
-        if self.exclude_pattern:
-            files_to_prompt_cmd.extend(["--ignore", self.exclude_pattern])
-
-        # List all files to chunk if needed
-        all_files = []
-        for root, _, files in os.walk(directory_path):
-            for file in files:
-                rel_path = os.path.relpath(os.path.join(root, file), directory_path)
-                all_files.append(rel_path)
+        # Size every file once; token counts come from tiktoken when installed, otherwise from the byte size.
+        # Content read for tiktoken is kept in file_texts, so building the prompts does not read those files again.
+        # The stat calls and reads are I/O bound (especially on network filesystems), so run them on a thread pool
+        exclude_re = re.compile(fnmatch.translate(self.exclude_pattern)) if self.exclude_pattern else None
+        gitignore_rules = None if self.ignore_gitignore else ()
+        entries = list(_iter_files(directory_path, exclude_re, gitignore_rules))
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            estimates = pool.map(functools.partial(_stat_and_estimate, model=self.model), (entry for _, entry in entries))
+            file_info = {}
+            file_texts = {}
+            for (rel_path, _), estimate in zip(entries, estimates):
+                if estimate is None:
+                    continue
+                size, tokens, text = estimate
+                file_info[rel_path] = (size, tokens)
+                if text is not None:
+                    file_texts[rel_path] = text
 
         max_tokens = self._get_token_limit()
-        total_tokens = 0
-        for rel_path in all_files:
-            abs_path = os.path.join(directory_path, rel_path)
-            if os.path.isfile(abs_path):
-                with open(abs_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    total_tokens += estimate_token_count(f.read())
-        if total_tokens <= max_tokens:
-            file_chunks = [all_files]
-        else:
-            file_chunks = chunk_files_for_token_limit(all_files, max_tokens, directory_path)
+        file_chunks, total_tokens = chunk_files_for_token_limit(file_info, max_tokens)
+        logging.info(f"Estimated {total_tokens} tokens across {len(file_info)} files, split into {len(file_chunks)} chunk(s)")
         chunk_outputs = []
+        chunk_errors = []
         total_file_count = 0
-        previous_chunk_output = None
+        rolling_summary = None
         logs_dir = os.path.join(os.path.dirname(__file__), 'logs')
         os.makedirs(logs_dir, exist_ok=True)
         chunks_dir = os.path.join(logs_dir, 'chunks')
-        os.makedirs(chunks_dir, exist_ok=True)
+        if self.debug_dump:
+            os.makedirs(chunks_dir, exist_ok=True)
+        llm_cache_dir = os.path.join(logs_dir, 'llm_cache')
+        if self.use_cache:
+            os.makedirs(llm_cache_dir, exist_ok=True)
+        if self.provider not in ["gemini", "openai", "claude", "meta"]:
+            logging.error(f"Unknown provider: {self.provider}")
+            return f"Error: Unknown provider '{self.provider}'", 1, 0
+        llm_cmd = self._build_llm_cmd()
+        # With parallel_chunks > 1 the prompts are collected here and sent to the LLM together after the loop
+        pending_prompts = []
         for chunk_idx, chunk_files in enumerate(file_chunks):
             logging.info(f"Processing chunk {chunk_idx}: {len(chunk_files)} files, files: {chunk_files}")
-            chunk_token_est = 0
-            for rel_path in chunk_files:
-                abs_path = os.path.join(directory_path, rel_path)
-                if os.path.isfile(abs_path):
-                    with open(abs_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        chunk_token_est += estimate_token_count(f.read())
+            chunk_token_est = sum(file_info[rel_path][1] for rel_path in chunk_files)
             logging.info(f"Estimated tokens for chunk {chunk_idx}: {chunk_token_est}")
-            chunk_cmd = files_to_prompt_cmd + chunk_files
-            try:
-                files_process_result = subprocess.run(
-                    chunk_cmd,
-                    capture_output=True,
-                    text=True,
-                    check=False,
-                    cwd=directory_path
-                )
-                if files_process_result.returncode != 0:
-                    error_msg = f"Error running 'files-to-prompt' for chunk {chunk_idx}: {files_process_result.stderr.strip()}"
-                    logging.error(error_msg)
-                    continue
-                prompt_content = files_process_result.stdout
-                # Save chunk prompt to file in 'chunks' directory
-                chunk_prompt_path = os.path.join(chunks_dir, f'chunk_{chunk_idx}_prompt.txt')
-                with open(chunk_prompt_path, 'w', encoding='utf-8') as f:
-                    f.write(prompt_content)
-                if not prompt_content.strip():
-                    logging.warning(f"No prompt content generated for chunk {chunk_idx}. Skipping chunk.")
-                    continue
-                file_count = self.count_files_in_prompt(prompt_content)
-                total_file_count += file_count
-                logging.info(f"files-to-prompt completed for chunk {chunk_idx}, file_count={file_count}, prompt length={len(prompt_content)}")
-            except FileNotFoundError:
-                logging.error("'files-to-prompt' command not found.")
-                return "Error: 'files-to-prompt' command not found. Please ensure it is installed.", 1, 0
-            except Exception as e:
-                logging.exception(f"Unexpected error with 'files-to-prompt': {str(e)}")
-                return f"Unexpected error with 'files-to-prompt': {str(e)}", 1, 0
+            prompt_content, file_count = build_documents_prompt(directory_path, chunk_files, file_texts)
+            # Save chunk prompt to file in 'chunks' directory
+            self._dump_chunk_file(os.path.join(chunks_dir, f'chunk_{chunk_idx}_prompt.txt'), prompt_content)
+            if not file_count:
+                logging.warning(f"No prompt content generated for chunk {chunk_idx}. Skipping chunk.")
+                continue
+            total_file_count += file_count
+            logging.info(f"Prompt built for chunk {chunk_idx}, file_count={file_count}, prompt length={len(prompt_content)}")
+
+            if self.parallel_chunks > 1:
+                pending_prompts.append((chunk_idx, [prompt_content]))
+                continue
 
             # --- NEW: Add previous chunk output to prompt for next chunk ---
-            if previous_chunk_output:
-                prompt_content = (
-                    f"Here is the output from the previous chunk conversion. Use this as context to maintain consistency and linkage between files:\n\n"
-                    f"{previous_chunk_output}\n\n"
-                    f"Now process the following files:\n\n{prompt_content}"
-                )
+            # The prefix is kept as a separate part and streamed ahead of the chunk content,
+            # so the (possibly large) prompt is never copied into a new string
+            prompt_parts = [prompt_content]
+            if rolling_summary:
+                prompt_parts.insert(0, (
+                    f"Here is a summary of the output from the previous chunks. Use this as context to maintain consistency and linkage between files:\n\n"
+                    f"{rolling_summary}\n\n"
+                    f"Now process the following files:\n\n"
+                ))
 
             try:
-                if self.provider in ["gemini", "openai", "claude", "meta"]:
-                    llm_cmd = ["llm", "-m", self.model, "-s", self.system_prompt]
-                else:
-                    logging.error(f"Unknown provider: {self.provider}")
-                    continue
-                logging.info(f"Running LLM command for chunk {chunk_idx}: {' '.join(llm_cmd)}")
-                llm_process = subprocess.Popen(
-                    llm_cmd,
-                    stdin=subprocess.PIPE,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True
-                )
-                output, error = llm_process.communicate(input=prompt_content)
-                return_code = llm_process.returncode
-                # Save chunk output to file in 'chunks' directory
-                chunk_output_path = os.path.join(chunks_dir, f'chunk_{chunk_idx}_output.txt')
-                with open(chunk_output_path, 'w', encoding='utf-8') as f:
-                    f.write(output)
-                if error and return_code != 0:
-                    logging.error(f"Error from LLM command: {error.strip()}")
-                    continue
-                if not output.strip():
-                    logging.warning(f"No output generated by LLM for chunk {chunk_idx}. Skipping chunk.")
-                    continue
-                if return_code == 0:
-                    formatted_output = self.format_markdown(output)
+                output, error, return_code = self._invoke_llm(chunk_idx, llm_cmd, prompt_parts, llm_cache_dir)
+                formatted_output = self._accept_llm_output(chunk_idx, output, error, return_code, chunks_dir, chunk_errors)
+                if formatted_output is not None:
                     chunk_outputs.append(formatted_output)
-                    previous_chunk_output = formatted_output
-                else:
-                    logging.error(f"LLM command failed with return code {return_code} for chunk {chunk_idx}")
+                    # Carry a bounded summary forward instead of the full output, so prompts stay flat across chunks
+                    if rolling_summary:
+                        rolling_summary = condense_chunk_output(f"{rolling_summary}\n\n{formatted_output}", model=self.model)
+                    else:
+                        rolling_summary = condense_chunk_output(formatted_output, model=self.model)
             except FileNotFoundError:
-                cmd_name = llm_cmd[0] if 'llm_cmd' in locals() else 'llm'
-                logging.error(f"'{cmd_name}' command not found.")
-                return f"Error: '{cmd_name}' command not found. Please ensure it is installed.", 1, 0
+                logging.error(f"'{llm_cmd[0]}' command not found.")
+                return f"Error: '{llm_cmd[0]}' command not found. Please ensure it is installed.", 1, 0
             except Exception as e:
                 error_msg = f"Unexpected error during LLM command execution: {str(e)}"
                 logging.exception(error_msg)
                 return error_msg, 1, file_count
+        if pending_prompts:
+            try:
+                results = asyncio.run(self._invoke_llm_parallel(llm_cmd, pending_prompts, llm_cache_dir))
+            except FileNotFoundError:
+                logging.error(f"'{llm_cmd[0]}' command not found.")
+                return f"Error: '{llm_cmd[0]}' command not found. Please ensure it is installed.", 1, 0
+            except Exception as e:
+                error_msg = f"Unexpected error during LLM command execution: {str(e)}"
+                logging.exception(error_msg)
+                return error_msg, 1, total_file_count
+            for (chunk_idx, _), (output, error, return_code) in zip(pending_prompts, results):
+                formatted_output = self._accept_llm_output(chunk_idx, output, error, return_code, chunks_dir, chunk_errors)
+                if formatted_output is not None:
+                    chunk_outputs.append(formatted_output)
         if not chunk_outputs:
             # Check if any chunk had an LLM error and display it to the user
-            llm_error_found = False
-            for chunk_idx in range(len(file_chunks)):
-                chunk_output_path = os.path.join(chunks_dir, f'chunk_{chunk_idx}_output.txt')
-                if os.path.exists(chunk_output_path):
-                    with open(chunk_output_path, 'r', encoding='utf-8') as f:
-                        chunk_output = f.read()
-                        if 'model is overloaded' in chunk_output.lower() or 'error:' in chunk_output.lower():
-                            print(chunk_output.strip())
-                            llm_error_found = True
-            if not llm_error_found:
+            for chunk_error in chunk_errors:
+                print(chunk_error)
+            if not chunk_errors:
                 logging.error("No output generated from any chunk. Check logs for details on each chunk's processing.")
                 print("No output generated from any chunk. Check logs for details on each chunk's processing.")
             return "Error: No output generated from any chunk. Check logs for details on each chunk's processing.", 1, 0
@@ -366,9 +833,8 @@ class CodeEyeEngine:
                     logging.info(f"System prompt at PDF check: {self.system_prompt}")
                     logging.info(f"Checking for mermaid code block in: {output_file}")
                     try:
-                        with open(output_file, 'r', encoding='utf-8') as f:
-                            md_content = f.read()
-                        if '```mermaid' in md_content:
+                        # merged_output is exactly what was written to output_file, so check it in memory
+                        if '```mermaid' in merged_output:
                             logging.info("Mermaid diagram found in markdown. Proceeding to PDF conversion.")
                         else:
                             logging.warning("No mermaid diagram found in markdown. PDF may not include diagram.")
@@ -17,6 +17,9 @@ Options:
     --ignore-gitignore: Ignore .gitignore rules when scanning files.
     --exclude (str): Glob pattern to exclude specific files (e.g., '*.test.ts').
     --quiet: Suppress file count information in the output.
+    --use-cache: Reuse cached LLM output for chunks whose prompt has not changed.
+    --parallel-chunks (int): Number of chunks to send to the LLM concurrently (default: 1).
+    --prompt-cache: Ask the provider to cache the prompt prefix (claude; needs llm-anthropic with the cache option).
 
 Returns:
     Writes the architectural overview to the specified output file or stdout.
@@ -41,13 +44,179 @@ Error Handling:
 """
 
 # Library imports
-import argparse
 import os
 import sys
 import logging
-from CodEyeEngine import CodeEyeEngine
+import re
+from types import SimpleNamespace
 
-def main():
+# Phrases in the system prompt that ask for a code conversion; the target language follows them
+_CONV_RE = re.compile(r"convert to |translate to |migration to |migrate to |rewrite in |port to ")
+
+# System prompts used for code conversion; _CONV_PROMPT_TMPL is filled in with .format(lang=...)
+_CONV_PROMPT_TMPL = (
+    "Convert the codebase to {lang} as requested. "
+    "Output the result as markdown file blocks, where each code block starts with the language, followed by a comment line with the file path, "
+    "and then the code content. For example: ```{lang}\n# path/to/file.{lang}\n...code...```. "
+    "Ensure every file to be created or converted is represented as a separate code block in this format. "
+    "Do not include any prose, explanation, or review comments—only the file blocks. "
+    "For files like README, requirements.txt, setup.py, etc., generate them according to best practices for {lang}. "
+    "The README.md file must be comprehensive and include: "
+    "- Project overview and purpose\n"
+    "- Features and architecture summary\n"
+    "- Setup and installation instructions (including prerequisites)\n"
+    "- How to install dependencies\n"
+    "- How to run the application (with example commands)\n"
+    "- How to run tests (if applicable)\n"
+    "- Usage examples\n"
+    "- Contribution guidelines (if appropriate)\n"
+    "- License section\n"
+    "All supporting files should be adapted for the new language and ecosystem."
+)
+
+_CONV_PROMPT_GENERIC = (
+    "Convert the codebase to the target language as requested. "
+    "Output the result as markdown file blocks, where each code block starts with the language, followed by a comment line with the file path, "
+    "and then the code content. For example: ```python\n# path/to/file.py\n...code...```. "
+    "Ensure every file to be created or converted is represented as a separate code block in this format. "
+    "Do not include any prose, explanation, or review comments—only the file blocks. "
+    "For files like README, requirements.txt, setup.py, etc., generate them according to best practices for the target language. "
+    "The README.md file must be comprehensive and include: "
+    "- Project overview and purpose\n"
+    "- Features and architecture summary\n"
+    "- Setup and installation instructions (including prerequisites)\n"
+    "- How to install dependencies\n"
+    "- How to run the application (with example commands)\n"
+    "- How to run tests (if applicable)\n"
+    "- Usage examples\n"
+    "- Contribution guidelines (if appropriate)\n"
+    "- License section\n"
+    "All supporting files should be adapted for the new language and ecosystem."
+)
+
+# Command-line options as (flags, argparse keyword arguments). The same table drives the fast
+# argv scanner below and the argparse parser that handles --help and error reporting.
+_OPTIONS = [
+    (("-s", "--system-prompt"), dict(
+        dest="system_prompt",
+        default="Provide a detailed architectural overview of the codebase as markdown, and always include an architecture diagram using mermaid syntax as part of the output.",
+        help="System prompt to use for the LLM"
+    )),
+    (("-m", "--model"), dict(
+        dest="model",
+        default=None,
+        help="LLM model to use"
+    )),
+    (("--provider",), dict(
+        dest="provider",
+        choices=["gemini", "openai", "claude", "meta"],
+        default="gemini",
+        help="LLM provider to use (default: gemini; options: gemini, openai, claude, meta)"
+    )),
+    (("-o", "--output"), dict(
+        dest="output",
+        help="Write output to specified markdown file instead of stdout"
+    )),
+    (("--ignore-gitignore",), dict(
+        dest="ignore_gitignore",
+        action="store_true",
+        help="Ignore .gitignore rules when scanning files (by default, .gitignore rules are respected)"
+    )),
+    (("--exclude",), dict(
+        dest="exclude",
+        help="Exclude files matching this glob pattern (e.g., '*.test.ts')"
+    )),
+    (("--quiet",), dict(
+        dest="quiet",
+        action="store_true",
+        help="Don't display file count information"
+    )),
+    (("--use-cache",), dict(
+        dest="use_cache",
+        action="store_true",
+        help="Reuse cached LLM output (logs/llm_cache) for chunks whose prompt has not changed"
+    )),
+    (("--parallel-chunks",), dict(
+        dest="parallel_chunks",
+        type=int,
+        default=1,
+        help="Number of chunks to send to the LLM concurrently (default: 1). Values above 1 drop the previous-chunk context"
+    )),
+    (("--prompt-cache",), dict(
+        dest="prompt_cache",
+        action="store_true",
+        help="Ask the provider to cache the prompt prefix across chunks (claude only; needs an llm-anthropic version with the cache option)"
+    )),
+]
+
+def _build_parser():
+    """
+    Builds the argparse parser from _OPTIONS. Only needed for --help and for reporting usage errors.
+    """
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Generate architectural overviews of codebases using Gemini AI"
+    )
+    parser.add_argument(
+        "directory",
+        help="Directory to analyze"
+    )
+    for flags, spec in _OPTIONS:
+        parser.add_argument(*flags, **spec)
+    return parser
+
+def _parse_argv(argv):
+    """
+    Parses argv in a single linear pass over the _OPTIONS table, without building an argparse parser.
+    Returns (args, unknown) like ArgumentParser.parse_known_args, or None for anything it does not handle
+    itself (--help, unknown or abbreviated options, missing or invalid values, no directory), so that
+    argparse can take over and produce its usual usage and error output.
+    """
+    lookup = {flag: spec for flags, spec in _OPTIONS for flag in flags}
+    values = {}
+    for _, spec in _OPTIONS:
+        action = spec.get("action")
+        values[spec["dest"]] = False if action == "store_true" else True if action == "store_false" else spec.get("default")
+    directory = None
+    unknown = []
+    i = 0
+    while i < len(argv):
+        token = argv[i]
+        i += 1
+        if token == "-" or not token.startswith("-"):
+            if directory is None:
+                directory = token
+            else:
+                unknown.append(token)
+            continue
+        flag, has_value, value = token.partition("=") if token.startswith("--") else (token, "", "")
+        spec = lookup.get(flag)
+        if spec is None:
+            return None
+        action = spec.get("action")
+        if action in ("store_true", "store_false"):
+            if has_value:
+                return None
+            values[spec["dest"]] = action == "store_true"
+            continue
+        if not has_value:
+            if i >= len(argv) or argv[i].startswith("-"):
+                return None
+            value = argv[i]
+            i += 1
+        if "type" in spec:
+            try:
+                value = spec["type"](value)
+            except ValueError:
+                return None
+        if "choices" in spec and value not in spec["choices"]:
+            return None
+        values[spec["dest"]] = value
+    if directory is None:
+        return None
+    return SimpleNamespace(directory=directory, **values), unknown
+
+def main(argv=None):
     # Setup logging
     logs_dir = os.path.join(os.path.dirname(__file__), 'logs')
     os.makedirs(logs_dir, exist_ok=True)
@@ -66,6 +235,9 @@ def main():
     and performs the codebase analysis. It handles output formatting, file count display,
     and error handling.
 
+    Args:
+        argv (list[str], optional): The arguments to parse, without the program name (default: sys.argv[1:]).
+
     Command-line arguments:
         directory (str): The directory to analyze.
         -s, --system-prompt (str): The system prompt to use for the LLM (default: "architectural overview as markdown").
@@ -75,54 +247,21 @@ def main():
         --ignore-gitignore (bool): Whether to ignore `.gitignore` rules when scanning files.
         --exclude (str): Glob pattern to exclude specific files (e.g., '*.test.ts').
         --quiet (bool): Suppress file count information in the output.
+        --use-cache (bool): Reuse cached LLM output for chunks whose prompt has not changed.
+        --parallel-chunks (int): Number of chunks to send to the LLM concurrently (default: 1).
+        --prompt-cache (bool): Ask the provider to cache the prompt prefix across chunks.
 
     Raises:
         SystemExit: Exits the program with the appropriate return code.
     """
-    parser = argparse.ArgumentParser(
-        description="Generate architectural overviews of codebases using Gemini AI"
-    )
-    parser.add_argument(
-        "directory",
-        help="Directory to analyze"
-    )
-    parser.add_argument(
-        "-s", "--system-prompt",
-        default="Provide a detailed architectural overview of the codebase as markdown, and always include an architecture diagram using mermaid syntax as part of the output.",
-        help="System prompt to use for the LLM"
-    )
-    parser.add_argument(
-        "-m", "--model",
-        default=None,
-        help="LLM model to use"
-    )
-    parser.add_argument(
-        "--provider",
-        choices=["gemini", "openai", "claude", "meta"],
-        default="gemini",
-        help="LLM provider to use (default: gemini; options: gemini, openai, claude, meta)"
-    )
-    parser.add_argument(
-        "-o", "--output",
-        help="Write output to specified markdown file instead of stdout"
-    )
-    parser.add_argument(
-        "--ignore-gitignore",
-        action="store_true",
-        help="Ignore .gitignore rules when scanning files (by default, .gitignore rules are respected)"
-    )
-    parser.add_argument(
-        "--exclude",
-        help="Exclude files matching this glob pattern (e.g., '*.test.ts')"
-    )
-    parser.add_argument(
-        "--quiet",
-        action="store_true",
-        help="Don't display file count information"
-    )
-
-    # Parse only the known arguments, ignoring any extras
-    args, unknown = parser.parse_known_args()
+    # Parse only the known arguments, ignoring any extras. The common case is handled by a single
+    # pass over argv; argparse is only built for --help and malformed command lines.
+    if argv is None:
+        argv = sys.argv[1:]
+    parsed = _parse_argv(argv)
+    if parsed is None:
+        parsed = _build_parser().parse_known_args(argv)
+    args, unknown = parsed
 
     # Set default model based on provider if not specified
     if args.model is None:
@@ -136,7 +275,7 @@ def main():
             args.model = "llama-3-70b-instruct"
 
     # Handle unknown arguments and set the system prompt if not explicitly provided
-    if unknown and "-s" not in sys.argv and "--system-prompt" not in sys.argv:
+    if unknown and "-s" not in argv and "--system-prompt" not in argv:
         args.system_prompt = " ".join(unknown)
 
     # Ensure the output file has a .md extension if specified
@@ -150,70 +289,32 @@ def main():
 
 
     # Detect code conversion intent in the system prompt BEFORE initializing the engine
-    conversion_keywords = [
-        "convert to ", "translate to ", "migration to ", "migrate to ", "rewrite in ", "port to "
-    ]
     lower_prompt = args.system_prompt.lower()
     target_language = None
-    for kw in conversion_keywords:
-        if kw in lower_prompt:
-            # Extract the language after the keyword
-            idx = lower_prompt.find(kw) + len(kw)
-            # Take the next word as the language (strip punctuation)
-            rest = lower_prompt[idx:].strip()
-            if rest:
-                # Only take the first word (language), ignore extra words
-                target_language = rest.split()[0].strip('.,:;!')
-            break
+    conversion_match = _CONV_RE.search(lower_prompt)
+    if conversion_match:
+        # Take the next word after the keyword as the language (strip punctuation), ignore extra words
+        rest = lower_prompt[conversion_match.end():].split(maxsplit=1)
+        if rest:
+            target_language = rest[0].strip('.,:;!')
     if target_language:
-        args.system_prompt = (
-            f"Convert the codebase to {target_language} as requested. "
-            f"Output the result as markdown file blocks, where each code block starts with the language, followed by a comment line with the file path, "
-            f"and then the code content. For example: ```{target_language}\n# path/to/file.{target_language}\n...code...```. "
-            f"Ensure every file to be created or converted is represented as a separate code block in this format. "
-            f"Do not include any prose, explanation, or review comments—only the file blocks. "
-            f"For files like README, requirements.txt, setup.py, etc., generate them according to best practices for {target_language}. "
-            f"The README.md file must be comprehensive and include: "
-            f"- Project overview and purpose\n"
-            f"- Features and architecture summary\n"
-            f"- Setup and installation instructions (including prerequisites)\n"
-            f"- How to install dependencies\n"
-            f"- How to run the application (with example commands)\n"
-            f"- How to run tests (if applicable)\n"
-            f"- Usage examples\n"
-            f"- Contribution guidelines (if appropriate)\n"
-            f"- License section\n"
-            f"All supporting files should be adapted for the new language and ecosystem."
-        )
-    elif any(kw in lower_prompt for kw in conversion_keywords):
-        args.system_prompt = (
-            "Convert the codebase to the target language as requested. "
-            "Output the result as markdown file blocks, where each code block starts with the language, followed by a comment line with the file path, "
-            "and then the code content. For example: ```python\n# path/to/file.py\n...code...```. "
-            "Ensure every file to be created or converted is represented as a separate code block in this format. "
-            "Do not include any prose, explanation, or review comments—only the file blocks. "
-            "For files like README, requirements.txt, setup.py, etc., generate them according to best practices for the target language. "
-            "The README.md file must be comprehensive and include: "
-            "- Project overview and purpose\n"
-            "- Features and architecture summary\n"
-            "- Setup and installation instructions (including prerequisites)\n"
-            "- How to install dependencies\n"
-            "- How to run the application (with example commands)\n"
-            "- How to run tests (if applicable)\n"
-            "- Usage examples\n"
-            "- Contribution guidelines (if appropriate)\n"
-            "- License section\n"
-            "All supporting files should be adapted for the new language and ecosystem."
-        )
+        args.system_prompt = _CONV_PROMPT_TMPL.format(lang=target_language)
+    elif conversion_match:
+        args.system_prompt = _CONV_PROMPT_GENERIC
 
     try:
+        # Imported here rather than at module level, so --help and usage errors don't pay for loading the engine
+        from CodEyeEngine import CodeEyeEngine
         # Initialize the CodeEyeEngine instance
         cee = CodeEyeEngine(
             system_prompt=args.system_prompt,
             model=args.model,
             ignore_gitignore=args.ignore_gitignore,
             exclude_pattern=args.exclude,
-            provider=args.provider
+            provider=args.provider,
+            use_cache=args.use_cache,
+            parallel_chunks=args.parallel_chunks,
+            prompt_cache=args.prompt_cache
         )
         logging.info(f'Initialized CodeEyeEngine with provider={args.provider}, model={args.model}')
         # Run the core function to describe the codebase
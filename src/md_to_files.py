@@ -13,6 +13,23 @@ Typical usage example:
 import os
 import re
 import sys
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+# Patterns used by Md2FilesConvertor.extract_file_blocks, compiled once at import time
+_LANG_RE = re.compile(r"[\w+-]*")
+_FILEPATH_RE = re.compile(r"^[\w\-./]+\.[\w\d]+$")
+
+def _find_fence(md_content, pos):
+    """
+    Returns the index of the next "```" at or after pos that starts a line, or -1 if there is none.
+    Backticks inside a line (inline code in prose) are not fences.
+    """
+    while True:
+        idx = md_content.find("```", pos)
+        if idx <= 0 or md_content[idx - 1] == "\n":
+            return idx
+        pos = idx + 3
 
 class Md2FilesConvertor:
     @staticmethod
@@ -22,28 +39,50 @@ class Md2FilesConvertor:
         Returns a list of tuples: (filepath, code, language)
         Only extracts blocks that start with a valid language and a valid file path comment.
         Ignores blocks where the file path is not a valid file path (e.g., markdown headings).
+        Fences are located with str.find and paired in a single linear pass, so the closing
+        fence of one block is never mistaken for the opening fence of the next. Only "```" at
+        the start of a line counts as a fence.
         """
-        code_block_pattern = re.compile(
-            r"```(\w+)?\s*\n#\s*([^\n]+)\n(.*?)```",
-            re.DOTALL
-        )
         blocks = []
-        for match in code_block_pattern.finditer(md_content):
-            lang = match.group(1) or ""
-            filepath = match.group(2).strip()
-            code = match.group(3)
+        pos = 0
+        while True:
+            start = _find_fence(md_content, pos)
+            if start < 0:
+                break
+            fence_end = md_content.find("\n", start + 3)
+            if fence_end < 0:
+                break
+            end = _find_fence(md_content, fence_end + 1)
+            if end < 0:
+                break
+            pos = end + 3
+            lang = md_content[start + 3:fence_end].rstrip()
+            if not _LANG_RE.fullmatch(lang):
+                continue
+            # The file path comment is the first non-blank line of the block
+            line_start = fence_end + 1
+            line_end = md_content.find("\n", line_start, end)
+            while line_end >= 0 and not md_content[line_start:line_end].strip():
+                line_start = line_end + 1
+                line_end = md_content.find("\n", line_start, end)
+            if line_end < 0:
+                continue
+            if not md_content.startswith("#", line_start):
+                continue
+            filepath = md_content[line_start + 1:line_end].strip()
             # Only allow filepaths that look like real files (must have an extension, no markdown heading)
-            if re.match(r"^[\w\-./]+\.[\w\d]+$", filepath):
-                blocks.append((filepath, code, lang))
+            if _FILEPATH_RE.match(filepath):
+                blocks.append((filepath, md_content[line_end + 1:end], lang))
         return blocks
 
     @staticmethod
-    def write_file(filepath, code):
+    def write_file(filepath, code, create_dirs=True):
         dirpath = os.path.dirname(filepath)
-        if dirpath:
+        if create_dirs and dirpath:
             os.makedirs(dirpath, exist_ok=True)
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(code.lstrip("\n"))
+        # Binary mode: one encode and one write, with no newline translation
+        with open(filepath, "wb") as f:
+            f.write(code.lstrip("\n").encode("utf-8"))
 
     @staticmethod
     def convert(md_path, output_dir=None):
@@ -57,9 +96,19 @@ class Md2FilesConvertor:
         if output_dir is None:
             script_dir = os.path.dirname(os.path.abspath(__file__))
             output_dir = os.path.join(script_dir, "output_files")
+        files = {}
         for filepath, code, lang in blocks:
             # Always write inside output_dir, preserving subdirectories, but prevent escaping
             safe_filepath = os.path.normpath(filepath).replace("..", "")
             abs_path = os.path.join(output_dir, safe_filepath)
-            Md2FilesConvertor.write_file(abs_path, code)
-            print(f"Wrote: {abs_path}")
+            # A path that appears more than once keeps its last block, as with sequential writes
+            files[abs_path] = code
+        # Create each directory once up front instead of once per file
+        for dirpath in sorted({os.path.dirname(abs_path) for abs_path in files}):
+            if dirpath:
+                os.makedirs(dirpath, exist_ok=True)
+        # Writing many small files is I/O bound, so overlap the writes on a thread pool
+        write = functools.partial(Md2FilesConvertor.write_file, create_dirs=False)
+        with ThreadPoolExecutor(max_workers=min(32, len(files))) as pool:
+            for abs_path, _ in zip(files, pool.map(write, files, files.values())):
+                print(f"Wrote: {abs_path}")
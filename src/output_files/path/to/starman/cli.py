@@ -1,7 +1,8 @@
-import argparse
 import os
 import sys
 import importlib
+import logging
+from types import SimpleNamespace
 from .server import Server
 from . import __version__
 
@@ -19,44 +20,125 @@ def load_app(app_uri):
     except (ImportError, AttributeError) as e:
         raise ImportError(f"Could not load application '{app_uri}': {e}")
 
-def main():
+# (flags, argparse keyword arguments). The same table drives the fast argv scanner
+# and the argparse parser that handles --help, --version and error reporting.
+_OPTIONS = [
+    (('-l', '--listen'), dict(dest='listen', action='append',
+        help='Listen on a TCP host:port or a UNIX socket path. '
+             'Can be specified multiple times. Defaults to 0.0.0.0:5000.')),
+    (('--host',), dict(dest='host', default='0.0.0.0',
+        help='Host to bind (default: 0.0.0.0). Deprecated: use --listen.')),
+    (('--port',), dict(dest='port', type=int, default=5000,
+        help='Port to bind (default: 5000). Deprecated: use --listen.')),
+    (('-w', '--workers'), dict(dest='workers', type=int, default=5,
+        help='Number of worker processes (default: 5).')),
+    (('--preload-app',), dict(dest='preload_app', action='store_true',
+        help='Load application in master process before forking.')),
+    (('--max-requests',), dict(dest='max_requests', type=int, default=1000,
+        help='Max requests a worker will process before restarting (default: 1000).')),
+    (('--timeout',), dict(dest='timeout', type=int, default=30,
+        help='Worker timeout in seconds (default: 30).')),
+    (('--keepalive-timeout',), dict(dest='keepalive_timeout', type=int, default=5,
+        help='Keep-alive connection timeout (default: 5).')),
+    (('--read-timeout',), dict(dest='read_timeout', type=int, default=5,
+        help='Timeout for reading a request from a new connection (default: 5).')),
+    (('--disable-keepalive',), dict(dest='disable_keepalive', action='store_true',
+        help='Disable keep-alive connections.')),
+    (('--reuseport',), dict(dest='reuseport', action='store_true',
+        help='Give every worker its own SO_REUSEPORT accept queue instead of sharing the\n'
+             "master's listening socket. Connections still queued for a worker are reset when\n"
+             'it exits (--max-requests, TTOU, HUP), and nothing listens during a HUP restart.')),
+    (('--queues',), dict(dest='queues', type=int, default=0,
+        help='Number of SO_REUSEPORT accept queues per TCP address, shared out among workers.\n'
+             'Default 0 shares one listening socket (or one queue per worker with --reuseport).')),
+    (('--queues-per-worker',), dict(dest='queues_per_worker', type=int, default=2,
+        help='How many of the --queues each worker accepts from (default: 2).')),
+    (('--accept-budget',), dict(dest='accept_budget', type=int, default=8,
+        help='Max connections a worker accepts from one socket per wakeup (default: 8).')),
+    (('--io-backend',), dict(dest='io_backend', choices=('select', 'asyncio'), default='select',
+        help='How workers serve connections: select handles one connection at a time,\n'
+             'asyncio multiplexes many per worker (with uvloop when installed). Default: select.')),
+    (('--cpu-affinity',), dict(dest='cpu_affinity', action='store_true',
+        help='Pin each worker to one CPU, by worker slot (Linux only). Works best with as many\n'
+             'workers as NIC receive queues, so each connection stays on the CPU that received it.')),
+    (('--backlog',), dict(dest='backlog', type=int, default=1024, help='Listen backlog size (default: 1024).')),
+    (('--user',), dict(dest='user', help='Switch to user after binding port.')),
+    (('--group',), dict(dest='group', help='Switch to group after binding port.')),
+    (('--pid',), dict(dest='pid', help='Path to PID file.')),
+    (('--error-log',), dict(dest='error_log', help='Path to error log file.')),
+    (('--daemonize',), dict(dest='daemonize', action='store_true', help='Daemonize the server process.')),
+    (('--disable-proctitle',), dict(dest='set_proctitle', action='store_false',
+        help='Disable setting process titles.')),
+    (('-v', '--version'), dict(action='version', version=f'Starman {__version__}')),
+]
+
+def _build_parser():
+    import argparse
     parser = argparse.ArgumentParser(
         description="Starman: A high-performance preforking WSGI server.",
         formatter_class=argparse.RawTextHelpFormatter
     )
-
     parser.add_argument('app_uri', help='WSGI application URI (e.g., myapp:app)')
-    parser.add_argument('-l', '--listen', action='append',
-                        help='Listen on a TCP host:port or a UNIX socket path. '
-                             'Can be specified multiple times. Defaults to 0.0.0.0:5000.')
-    parser.add_argument('--host', default='0.0.0.0',
-                        help='Host to bind (default: 0.0.0.0). Deprecated: use --listen.')
-    parser.add_argument('--port', type=int, default=5000,
-                        help='Port to bind (default: 5000). Deprecated: use --listen.')
-    parser.add_argument('-w', '--workers', type=int, default=5,
-                        help='Number of worker processes (default: 5).')
-    parser.add_argument('--preload-app', action='store_true',
-                        help='Load application in master process before forking.')
-    parser.add_argument('--max-requests', type=int, default=1000,
-                        help='Max requests a worker will process before restarting (default: 1000).')
-    parser.add_argument('--timeout', type=int, default=30,
-                        help='Worker timeout in seconds (default: 30).')
-    parser.add_argument('--keepalive-timeout', type=int, default=5,
-                        help='Keep-alive connection timeout (default: 5).')
-    parser.add_argument('--read-timeout', type=int, default=5,
-                        help='Timeout for reading a request from a new connection (default: 5).')
-    parser.add_argument('--disable-keepalive', action='store_true', help='Disable keep-alive connections.')
-    parser.add_argument('--backlog', type=int, default=1024, help='Listen backlog size (default: 1024).')
-    parser.add_argument('--user', help='Switch to user after binding port.')
-    parser.add_argument('--group', help='Switch to group after binding port.')
-    parser.add_argument('--pid', help='Path to PID file.')
-    parser.add_argument('--error-log', help='Path to error log file.')
-    parser.add_argument('--daemonize', action='store_true', help='Daemonize the server process.')
-    parser.add_argument('--disable-proctitle', action='store_false', dest='set_proctitle',
-                        help='Disable setting process titles.')
-    parser.add_argument('-v', '--version', action='version', version=f'Starman {__version__}')
+    for flags, spec in _OPTIONS:
+        parser.add_argument(*flags, **spec)
+    return parser
 
-    args = parser.parse_args()
+def _parse_argv(argv):
+    """
+    Parses argv in one linear pass over _OPTIONS without building an argparse parser.
+    Returns None for anything it does not handle itself (--help, --version, unknown or
+    abbreviated options, missing or invalid values), so argparse can report it as usual.
+    """
+    lookup = {flag: spec for flags, spec in _OPTIONS for flag in flags}
+    values = {}
+    for _, spec in _OPTIONS:
+        if 'dest' in spec:
+            action = spec.get('action')
+            values[spec['dest']] = (action == 'store_false') if action in ('store_true', 'store_false') else spec.get('default')
+    app_uri = None
+    i = 0
+    while i < len(argv):
+        token = argv[i]
+        i += 1
+        if token == '-' or not token.startswith('-'):
+            if app_uri is not None:
+                return None
+            app_uri = token
+            continue
+        flag, has_value, value = token.partition('=') if token.startswith('--') else (token, '', '')
+        spec = lookup.get(flag)
+        if spec is None or spec.get('action') == 'version':
+            return None
+        action = spec.get('action')
+        if action in ('store_true', 'store_false'):
+            if has_value:
+                return None
+            values[spec['dest']] = action == 'store_true'
+            continue
+        if not has_value:
+            if i >= len(argv) or argv[i].startswith('-'):
+                return None
+            value = argv[i]
+            i += 1
+        if 'type' in spec:
+            try:
+                value = spec['type'](value)
+            except ValueError:
+                return None
+        if 'choices' in spec and value not in spec['choices']:
+            return None
+        if action == 'append':
+            values[spec['dest']] = (values[spec['dest']] or []) + [value]
+        else:
+            values[spec['dest']] = value
+    if app_uri is None:
+        return None
+    return SimpleNamespace(app_uri=app_uri, **values)
+
+def main():
+    args = _parse_argv(sys.argv[1:])
+    if args is None:
+        args = _build_parser().parse_args()
 
     if not args.listen:
         args.listen = [f"{args.host}:{args.port}"]
@@ -92,6 +174,13 @@ def main():
         sys.stderr.write(f"Error: {e}\n")
         sys.exit(1)
 
+    # Master and workers log through the 'starman' logger; the pid tells them apart
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter('[%(process)d] %(message)s'))
+    log = logging.getLogger('starman')
+    log.addHandler(handler)
+    log.setLevel(logging.INFO)
+
     server = Server(app, args)
     server.run()
 
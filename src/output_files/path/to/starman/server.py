@@ -1,13 +1,17 @@
 import os
-import sys
 import socket
 import signal
 import time
+import logging
 import errno
+import gc
+import selectors
 import pwd
 import grp
 from .worker import Worker
 
+log = logging.getLogger('starman')
+
 try:
     import setproctitle
 except ImportError:
@@ -27,7 +31,16 @@ class Server:
         self.app = app
         self.options = options
         self.sockets = []
+        # fds of TCP sockets that are only bound in the master; each worker listens on its own SO_REUSEPORT copy
+        self.reuseport_fds = set()
+        # With --queues: one list of SO_REUSEPORT listening sockets per TCP address, shared out among workers
+        self.queue_groups = []
         self.workers = {}
+        self.worker_slots = {}
+        # Master event loop: signal wakeup pipe plus one pidfd per worker (pid -> fd); None means poll once a second
+        self.sel = None
+        self.wakeup_fds = ()
+        self.pid_to_fd = {}
         self.running = True
         self.worker_count = self.options.workers
         self.pid = os.getpid()
@@ -44,20 +57,23 @@ class Server:
         self.setup_privileges()
 
         if self.options.preload_app:
-            print(f"[{self.pid}] Pre-loading application.")
-            # App is already loaded by cli.py
-            pass
+            log.info("Pre-loading application.")
+            # App is already loaded by cli.py. Collect once, then move everything that survived into the
+            # permanent generation: the workers' collections then never touch (and copy) those pages
+            gc.collect()
+            gc.freeze()
         
         self.setup_signal_handlers()
+        self.setup_wakeup()
         self.master_loop()
-        print(f"[{self.pid}] Master process exiting.")
+        log.info("Master process exiting.")
         self.close_sockets()
 
     def setup_sockets(self):
         server_starter_fd = os.environ.get('SERVER_STARTER_PORT')
         if server_starter_fd:
             host, port, fd = server_starter_fd.split('=')
-            print(f"[{self.pid}] Binding to socket from server_starter (fd: {fd})")
+            log.info("Binding to socket from server_starter (fd: %s)", fd)
             s = socket.fromfd(int(fd), socket.AF_INET, socket.SOCK_STREAM)
             s.listen(self.options.backlog)
             self.sockets.append(s)
@@ -67,6 +83,27 @@ class Server:
             if ':' in listen_addr:
                 host, port = listen_addr.rsplit(':', 1)
                 addr = (host, int(port))
+                if self.options.queues and hasattr(socket, 'SO_REUSEPORT'):
+                    # A fixed set of accept queues, more than one per worker, so a worker stuck on a
+                    # slow request never holds the only queue some connections are hashed to
+                    group = []
+                    for _ in range(self.options.queues):
+                        s = self.make_reuseport_socket(socket.AF_INET, addr)
+                        s.listen(self.options.backlog)
+                        addr = s.getsockname()
+                        group.append(s)
+                    self.sockets.extend(group)
+                    self.queue_groups.append(group)
+                    log.info("Listening at %s (SO_REUSEPORT, %s queues)", listen_addr, len(group))
+                    continue
+                if self.use_reuseport():
+                    # Bound but never listening: reserves the port and checks the address up front,
+                    # while the kernel balances connections across the workers' own accept queues
+                    s = self.make_reuseport_socket(socket.AF_INET, addr)
+                    self.sockets.append(s)
+                    self.reuseport_fds.add(s.fileno())
+                    log.info("Listening at %s (SO_REUSEPORT, one queue per worker)", listen_addr)
+                    continue
                 s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             else:
                 addr = listen_addr
@@ -81,7 +118,44 @@ class Server:
             s.bind(addr)
             s.listen(self.options.backlog)
             self.sockets.append(s)
-            print(f"[{self.pid}] Listening at {listen_addr} ({s.fileno()})")
+            log.info("Listening at %s (%s)", listen_addr, s.fileno())
+
+    def use_reuseport(self):
+        # Per-worker queues are opt-in: a worker's queue, and any connection still waiting in it,
+        # goes away when the worker exits, while the master's shared socket keeps them queued.
+        # Linux only lets sockets owned by the same user join a SO_REUSEPORT group, so workers that
+        # switch to another user could not bind next to the master; they share its socket instead
+        return self.options.reuseport and hasattr(socket, 'SO_REUSEPORT') and not self.options.user
+
+    def make_reuseport_socket(self, family, addr):
+        s = socket.socket(family, socket.SOCK_STREAM)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        s.bind(addr)
+        return s
+
+    def open_worker_sockets(self, slot):
+        queue_fds = {s.fileno() for group in self.queue_groups for s in group}
+        sockets = []
+        for s in self.sockets:
+            if s.fileno() in queue_fds:
+                continue
+            if s.fileno() not in self.reuseport_fds:
+                sockets.append(s)
+                continue
+            ws = self.make_reuseport_socket(s.family, s.getsockname())
+            ws.listen(self.options.backlog)
+            s.close()
+            sockets.append(ws)
+        # Workers start at evenly spaced queues and take the next queues_per_worker of them, wrapping
+        # around, so neighbouring workers overlap. Taking at least queues / workers each means no queue
+        # is left without a worker.
+        for group in self.queue_groups:
+            start = slot * len(group) // self.worker_count
+            per_worker = max(self.options.queues_per_worker, -(-len(group) // self.worker_count))
+            per_worker = min(per_worker, len(group))
+            sockets.extend(group[(start + k) % len(group)] for k in range(per_worker))
+        return sockets
 
     def setup_privileges(self):
         if self.options.group:
@@ -90,27 +164,61 @@ class Server:
             except ValueError:
                 gid = grp.getgrnam(self.options.group).gr_gid
             os.setgid(gid)
-            print(f"[{self.pid}] Switched to group {self.options.group}")
+            log.info("Switched to group %s", self.options.group)
         if self.options.user:
             try:
                 uid = int(self.options.user)
             except ValueError:
                 uid = pwd.getpwnam(self.options.user).pw_uid
             os.setuid(uid)
-            print(f"[{self.pid}] Switched to user {self.options.user}")
+            log.info("Switched to user %s", self.options.user)
 
     def setup_signal_handlers(self):
         for sig, handler_name in self.SIGNALS.items():
             signal.signal(sig, getattr(self, handler_name))
 
+    def setup_wakeup(self):
+        try:
+            os.close(os.pidfd_open(self.pid))
+            r, w = os.pipe()
+        except (AttributeError, OSError):
+            # No pidfd_open (Python < 3.9 or Linux < 5.3): keep polling
+            return
+        os.set_blocking(r, False)
+        os.set_blocking(w, False)
+        signal.set_wakeup_fd(w)
+        self.wakeup_fds = (r, w)
+        self.sel = selectors.DefaultSelector()
+        self.sel.register(r, selectors.EVENT_READ)
+
+    def wait_for_events(self):
+        if self.sel is None:
+            time.sleep(1)
+            return
+        for key, _ in self.sel.select():
+            if key.fd == self.wakeup_fds[0]:
+                try:
+                    while os.read(key.fd, 4096):
+                        pass
+                except BlockingIOError:
+                    pass
+
+    def close_wakeup(self):
+        signal.set_wakeup_fd(-1)
+        for fd in list(self.pid_to_fd.values()) + list(self.wakeup_fds):
+            os.close(fd)
+        self.sel.close()
+        self.sel = None
+        self.pid_to_fd = {}
+
     def master_loop(self):
         self.spawn_workers()
         while self.running:
             try:
+                self.wait_for_events()
                 self.check_signals()
                 self.reap_workers()
                 self.maintain_worker_count()
-                time.sleep(1)
             except InterruptedError:
                 continue
             except KeyboardInterrupt:
@@ -126,17 +234,19 @@ class Server:
         if self._ttin_received:
             self._ttin_received = False
             self.worker_count += 1
-            print(f"[{self.pid}] Increasing worker count to {self.worker_count}")
+            log.info("Increasing worker count to %s", self.worker_count)
         if self._ttou_received:
             self._ttou_received = False
             if self.worker_count > 1:
                 self.worker_count -= 1
-                print(f"[{self.pid}] Decreasing worker count to {self.worker_count}")
+                log.info("Decreasing worker count to %s", self.worker_count)
 
     def graceful_restart(self):
-        print(f"[{self.pid}] HUP received. Restarting workers.")
+        log.info("HUP received. Restarting workers.")
         self.kill_workers(signal.SIGTERM)
-        self.reap_workers(block=True)
+        while self.workers:
+            self.wait_for_events()
+            self.reap_workers()
         self.spawn_workers()
 
     def kill_workers(self, sig):
@@ -145,42 +255,71 @@ class Server:
                 os.kill(pid, sig)
             except OSError as e:
                 if e.errno == errno.ESRCH:
-                    self.workers.pop(pid, None)
+                    self.forget_worker(pid)
 
     def spawn_workers(self):
         while len(self.workers) < self.worker_count:
             self.spawn_worker()
 
     def spawn_worker(self):
+        used_slots = set(self.worker_slots.values())
+        slot = next(i for i in range(len(used_slots) + 1) if i not in used_slots)
         pid = os.fork()
         if pid == 0:  # Child
+            if self.sel is not None:
+                self.close_wakeup()
+            if self.options.cpu_affinity:
+                self.pin_to_cpu(slot)
             self.set_proc_title("worker")
             try:
-                worker = Worker(self.app, self.options, self.sockets)
+                worker = Worker(self.app, self.options, self.open_worker_sockets(slot))
                 worker.run()
             except Exception as e:
-                print(f"Worker {os.getpid()} exited with error: {e}", file=sys.stderr)
+                log.error("Worker exited with error: %s", e)
             finally:
                 os._exit(0)
         else:  # Parent
             self.workers[pid] = time.time()
-            print(f"[{self.pid}] Spawned worker {pid}")
+            self.worker_slots[pid] = slot
+            if self.sel is not None:
+                fd = os.pidfd_open(pid)
+                self.pid_to_fd[pid] = fd
+                self.sel.register(fd, selectors.EVENT_READ)
+            log.info("Spawned worker %s", pid)
 
-    def reap_workers(self, block=False):
-        options = 0 if not block else os.WNOHANG
-        try:
-            while True:
-                pid, status = os.waitpid(-1, options)
-                if pid == 0 and not block:
-                    break
-                if pid in self.workers:
-                    del self.workers[pid]
-                    print(f"[{self.pid}] Reaped worker {pid} (status: {status})")
-                if block and not self.workers:
-                    break
-        except OSError as e:
-            if e.errno != errno.ECHILD:
-                raise
+    def pin_to_cpu(self, slot):
+        if not hasattr(os, 'sched_setaffinity'):
+            return
+        # Spread over the CPUs this process may use, which can be fewer than os.cpu_count()
+        cpus = sorted(os.sched_getaffinity(0))
+        os.sched_setaffinity(0, {cpus[slot % len(cpus)]})
+
+    def forget_worker(self, pid):
+        self.workers.pop(pid, None)
+        self.worker_slots.pop(pid, None)
+        fd = self.pid_to_fd.pop(pid, None)
+        if fd is not None:
+            self.sel.unregister(fd)
+            os.close(fd)
+
+    def reap_workers(self):
+        # One waitid() per exited child; pidfd readiness only tells us that there is something to reap
+        while True:
+            try:
+                if hasattr(os, 'waitid'):
+                    info = os.waitid(os.P_ALL, 0, os.WEXITED | os.WNOHANG)
+                    if info is None:
+                        break
+                    pid, status = info.si_pid, info.si_status
+                else:
+                    pid, status = os.waitpid(-1, os.WNOHANG)
+                    if pid == 0:
+                        break
+            except ChildProcessError:
+                break
+            if pid in self.workers:
+                self.forget_worker(pid)
+                log.info("Reaped worker %s (status: %s)", pid, status)
 
     def maintain_worker_count(self):
         diff = self.worker_count - len(self.workers)
@@ -188,9 +327,12 @@ class Server:
             for _ in range(diff):
                 self.spawn_worker()
         elif diff < 0:
-            pids_to_kill = list(self.workers.keys())[:abs(diff)]
-            for pid in pids_to_kill:
-                self.kill_workers(signal.SIGTERM)
+            for pid in list(self.workers.keys())[:abs(diff)]:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except OSError as e:
+                    if e.errno == errno.ESRCH:
+                        self.forget_worker(pid)
     
     def close_sockets(self):
         for s in self.sockets:
@@ -1,53 +1,158 @@
 import os
 import sys
 import socket
+import signal
+import select
+import selectors
+import asyncio
+import functools
 import errno
 import time
+import logging
 import io
 from email.utils import formatdate
 from httptools import HttpRequestParser
 from httptools.parser import HttpParserError
+from . import __version__
 
 try:
     import setproctitle
 except ImportError:
     setproctitle = None
 
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+log = logging.getLogger('starman')
+
+# Most systems cap a single writev() at 1024 buffers
+_IOV_MAX = 1024
+
+# The Date header only changes once a second: [second, encoded header line]
+_DATE_CACHE = [0, b'']
+
+# Status string -> encoded status line; apps use a handful of statuses
+_STATUS_LINES = {}
+_STATUS_LINES_MAX = 64
+_SERVER_HEADER = f'Server: Starman/{__version__}\r\n'.encode('latin-1')
+
+# The part of the WSGI environ that is the same for every request; on_message_begin copies it
+_ENVIRON_TEMPLATE = {
+    'wsgi.version': (1, 0),
+    'wsgi.url_scheme': 'http', # TODO: SSL
+    'wsgi.errors': sys.stderr,
+    'wsgi.multithread': False,
+    'wsgi.multiprocess': True,
+    'wsgi.run_once': False,
+    'SERVER_SOFTWARE': f'Starman/{__version__}',
+    'REQUEST_METHOD': '',
+    'SCRIPT_NAME': '',
+    'PATH_INFO': '',
+    'QUERY_STRING': '',
+}
+
+# Raw request header name -> (environ key, header name); clients send the same few names over and over
+_HEADER_NAMES = {}
+_HEADER_NAMES_MAX = 512
+
+class InputStream(io.BufferedIOBase):
+    # wsgi.input over the request body as one bytes object; a body that arrived in a single
+    # chunk is never copied, and read() of the whole body returns that same object
+    def __init__(self, data=b''):
+        self.data = data
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        data, pos = self.data, self.pos
+        if pos == 0 and (size is None or size < 0 or size >= len(data)):
+            self.pos = len(data)
+            return data
+        end = len(data) if size is None or size < 0 else min(pos + size, len(data))
+        self.pos = end
+        return data[pos:end]
+
+    read1 = read
+
+    def readinto(self, b):
+        view = memoryview(self.data)[self.pos:self.pos + len(b)]
+        n = len(view)
+        b[:n] = view
+        self.pos += n
+        return n
+
+    def readline(self, size=-1):
+        data, pos = self.data, self.pos
+        end = data.find(b'\n', pos) + 1 or len(data)
+        if size is not None and size >= 0:
+            end = min(end, pos + size)
+        self.pos = end
+        return data[pos:end]
+
+def send_buffers(sock, buffers):
+    # sendall() for several buffers at once: one sendmsg() (writev) per round instead of one send per buffer
+    buffers = [memoryview(b) for b in buffers if b]
+    i = 0
+    while i < len(buffers):
+        sent = sock.sendmsg(buffers[i:i + _IOV_MAX])
+        while sent:
+            n = buffers[i].nbytes
+            if sent < n:
+                buffers[i] = buffers[i][sent:]
+                break
+            sent -= n
+            i += 1
+
 class RequestHandler:
-    def __init__(self, app, client_sock, client_addr, options, sockets):
+    def __init__(self, app, client_sock, client_addr, options, sockets, server_address=None):
         self.app = app
-        self.client = client_sock
-        self.addr = client_addr
         self.options = options
         self.sockets = sockets
         self.parser = HttpRequestParser(self)
+        # Receive buffer, kept for the life of the (pooled) handler; httptools copies what it passes on
+        self.recv_buffer = bytearray(65536)
+        self.recv_view = memoryview(self.recv_buffer)
+        # True while the parser sits between two keep-alive messages, so the next connection can use it
+        self.parser_reusable = True
+        self.reset(client_sock, client_addr, server_address)
+
+    def reset(self, client_sock, client_addr, server_address=None):
+        # Rebind a pooled handler to a new connection
+        self.client = client_sock
+        self.addr = client_addr
+        # (SERVER_NAME, SERVER_PORT); looked up on the connection itself when not known from the listener
+        self.server_address = server_address
+        if not self.parser_reusable:
+            # httptools parsers cannot be reset after a partial message, an error or Connection: close
+            self.parser = HttpRequestParser(self)
+        self.parser_reusable = False
+        self.in_message = False
         self.headers = []
-        self.body = io.BytesIO()
+        self.body_chunks = []
+        self.body = InputStream()
         self.environ = {}
         self.response = {}
 
     def on_message_begin(self):
+        self.parser_reusable = False
+        self.in_message = True
         self.headers = []
-        self.body = io.BytesIO()
-        self.environ = {
-            'wsgi.version': (1, 0),
-            'wsgi.url_scheme': 'http', # TODO: SSL
-            'wsgi.input': self.body,
-            'wsgi.errors': sys.stderr,
-            'wsgi.multithread': False,
-            'wsgi.multiprocess': True,
-            'wsgi.run_once': False,
-            'SERVER_SOFTWARE': f'Starman/{self.options.version}',
-            'REQUEST_METHOD': '',
-            'SCRIPT_NAME': '',
-            'PATH_INFO': '',
-            'QUERY_STRING': '',
-            'SERVER_NAME': self.client.getsockname()[0],
-            'SERVER_PORT': str(self.client.getsockname()[1]),
-            'REMOTE_ADDR': self.addr[0],
-            'REMOTE_PORT': str(self.addr[1]),
-            'wsgix.informational': self.write_informational,
-        }
+        self.body_chunks = []
+        self.response = {}
+        environ = self.environ = _ENVIRON_TEMPLATE.copy()
+        if self.server_address is None:
+            name = self.client.getsockname()
+            self.server_address = (name[0], str(name[1]))
+        environ['SERVER_NAME'], environ['SERVER_PORT'] = self.server_address
+        if isinstance(self.addr, tuple):
+            # Unix socket peers have no address
+            environ['REMOTE_ADDR'] = self.addr[0]
+            environ['REMOTE_PORT'] = str(self.addr[1])
+        environ['wsgix.informational'] = self.write_informational
 
     def on_url(self, url):
         self.environ['RAW_URI'] = url.decode('latin-1')
@@ -56,14 +161,19 @@ class RequestHandler:
         self.environ['QUERY_STRING'] = query.decode('latin-1')
 
     def on_header(self, name, value):
-        name = name.decode('latin-1').upper().replace('-', '_')
-        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
-            name = f"HTTP_{name}"
-        self.environ[name] = value.decode('latin-1')
-        self.headers.append((name.replace('_', '-'), value))
+        names = _HEADER_NAMES.get(name)
+        if names is None:
+            key = name.decode('latin-1').upper().replace('-', '_')
+            if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                key = f"HTTP_{key}"
+            names = (key, key.replace('_', '-'))
+            if len(_HEADER_NAMES) < _HEADER_NAMES_MAX:
+                _HEADER_NAMES[name] = names
+        self.environ[names[0]] = value.decode('latin-1')
+        self.headers.append((names[1], value))
 
     def on_body(self, body):
-        self.body.write(body)
+        self.body_chunks.append(body)
 
     def on_headers_complete(self):
         self.environ['REQUEST_METHOD'] = self.parser.get_method().decode('latin-1')
@@ -73,22 +183,26 @@ class RequestHandler:
             self.client.sendall(b'HTTP/1.1 100 Continue\r\n\r\n')
 
     def on_message_complete(self):
-        self.body.seek(0)
+        chunks = self.body_chunks
+        self.body = InputStream(chunks[0] if len(chunks) == 1 else b''.join(chunks))
+        self.environ['wsgi.input'] = self.body
         self.handle_request()
+        self.parser_reusable = self.parser.should_keep_alive()
+        self.in_message = False
 
     def handle_request(self):
+        resp_iter = None
         try:
             resp_iter = self.app(self.environ, self.start_response)
             self.write_response(resp_iter)
         except Exception:
             # TODO: Better error handling
-            exc_info = sys.exc_info()
+            log.exception("Error handling request %s", self.environ.get('PATH_INFO'))
             if not self.response:
                 self.start_response("500 Internal Server Error", [])
             self.write_response([b"Internal Server Error"])
-            print(f"Error handling request: {exc_info}", file=sys.stderr)
         finally:
-            if hasattr(resp_iter, 'close'):
+            if resp_iter is not None and hasattr(resp_iter, 'close'):
                 resp_iter.close()
 
     def start_response(self, status, headers, exc_info=None):
@@ -115,6 +229,13 @@ class RequestHandler:
         self.client.sendall(data)
 
     def write_response(self, resp_iter):
+        if isinstance(resp_iter, (list, tuple)):
+            body, rest = resp_iter, None
+        else:
+            # start_response may be called lazily, while the app produces its first block
+            rest = iter(resp_iter)
+            body = [next(rest, b'')]
+
         status = self.response['status']
         headers = self.response['headers']
         
@@ -122,22 +243,35 @@ class RequestHandler:
         has_cl = any(h[0].lower() == 'content-length' for h in headers)
         has_date = any(h[0].lower() == 'date' for h in headers)
         
-        if not has_date:
-            headers.append(('Date', formatdate(time.time(), usegmt=True)))
-
-        headers.append(('Server', f'Starman/{self.options.version}'))
-
-        # Prepare headers for sending
-        header_data = [f"HTTP/1.1 {status}".encode('latin-1')]
+        # Prepare headers for sending, as encoded fragments joined once
+        status_line = _STATUS_LINES.get(status)
+        if status_line is None:
+            status_line = f"HTTP/1.1 {status}\r\n".encode('latin-1')
+            if len(_STATUS_LINES) < _STATUS_LINES_MAX:
+                _STATUS_LINES[status] = status_line
+        parts = [status_line]
         for name, value in headers:
-            header_data.append(f"{name}: {value}".encode('latin-1'))
-        
-        self.client.sendall(b'\r\n'.join(header_data) + b'\r\n\r\n')
+            parts.append(name if isinstance(name, bytes) else name.encode('latin-1'))
+            parts.append(b': ')
+            parts.append(value if isinstance(value, bytes) else value.encode('latin-1'))
+            parts.append(b'\r\n')
 
-        # Send body
-        for chunk in resp_iter:
-            if chunk:
-                self.client.sendall(chunk)
+        if not has_date:
+            now = int(time.time())
+            if now != _DATE_CACHE[0]:
+                _DATE_CACHE[0] = now
+                _DATE_CACHE[1] = f"Date: {formatdate(now, usegmt=True)}\r\n".encode('latin-1')
+            parts.append(_DATE_CACHE[1])
+        parts.append(_SERVER_HEADER)
+        parts.append(b'\r\n')
+
+        # Headers go out together with the body, or with its first block when it is streamed;
+        # later blocks are sent as the app yields them
+        send_buffers(self.client, [b''.join(parts), *body])
+        if rest is not None:
+            for chunk in rest:
+                if chunk:
+                    self.client.sendall(chunk)
 
         # If no content-length, we can't do keep-alive unless chunked
         # This implementation is simplified and doesn't do response chunking.
@@ -145,25 +279,70 @@ class RequestHandler:
     def handle(self):
         try:
             while True:
-                data = self.client.recv(65536)
-                if not data:
+                n = self.client.recv_into(self.recv_buffer)
+                if not n:
                     break
                 try:
-                    self.parser.feed_data(data)
+                    self.parser.feed_data(self.recv_view[:n])
                 except HttpParserError as e:
-                    print(f"HTTP parse error: {e}", file=sys.stderr)
+                    log.error("HTTP parse error: %s", e)
                     # Simplified: just close connection on parse error
                     break
                 
-                # Simplified keep-alive: break after one request if disabled
-                if self.options.disable_keepalive:
+                # Simplified keep-alive: break after one request if disabled, but not in the
+                # middle of one whose headers or body are still arriving
+                if self.options.disable_keepalive and not self.in_message:
                     break
         except socket.error as e:
             if e.errno not in (errno.EPIPE, errno.ECONNRESET):
-                print(f"Socket error: {e}", file=sys.stderr)
+                log.error("Socket error: %s", e)
         finally:
             self.client.close()
 
+class TransportSocket:
+    # The socket calls RequestHandler makes, on top of an asyncio transport (--io-backend asyncio)
+    def __init__(self, transport):
+        self.transport = transport
+
+    def sendall(self, data):
+        self.transport.write(data)
+
+    def sendmsg(self, buffers):
+        self.transport.writelines(buffers)
+        return sum(memoryview(b).nbytes for b in buffers)
+
+    def getsockname(self):
+        return self.transport.get_extra_info('sockname')
+
+    def close(self):
+        self.transport.close()
+
+class HttpProtocol(asyncio.Protocol):
+    def __init__(self, worker, server_address):
+        self.worker = worker
+        self.server_address = server_address
+        self.transport = None
+        self.handler = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.handler = self.worker.get_handler(
+            TransportSocket(transport), transport.get_extra_info('peername'), self.server_address)
+        self.worker.connection_made(self)
+
+    def data_received(self, data):
+        try:
+            self.handler.parser.feed_data(data)
+        except HttpParserError as e:
+            log.error("HTTP parse error: %s", e)
+            self.transport.close()
+            return
+        if (self.worker.options.disable_keepalive or self.worker.draining) and not self.handler.in_message:
+            self.transport.close()
+
+    def connection_lost(self, exc):
+        self.worker.connection_lost(self)
+
 class Worker:
     def __init__(self, app, options, sockets):
         self.app = app
@@ -171,6 +350,13 @@ class Worker:
         self.sockets = sockets
         self.requests_processed = 0
         self.pid = os.getpid()
+        # Idle RequestHandlers, reused for later connections
+        self.handler_pool = []
+        # --io-backend asyncio: the asyncio servers, open HttpProtocols and the future serve() waits on
+        self.servers = []
+        self.connections = set()
+        self.draining = False
+        self.finished = None
 
     def run(self):
         if not self.options.preload_app:
@@ -180,17 +366,138 @@ class Worker:
         signal.signal(signal.SIGINT, signal.SIG_DFL)
         signal.signal(signal.SIGTERM, signal.SIG_DFL)
         
-        print(f"[{self.pid}] Worker started.")
+        log.info("Worker started.")
+
+        for s in self.sockets:
+            if s.family in (socket.AF_INET, socket.AF_INET6):
+                # No Nagle delay on responses, and keep-alive probes for idle connections; accepted
+                # sockets inherit both options from the listener, so no setsockopt per connection
+                s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                s.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
 
+        if self.options.io_backend == 'asyncio':
+            if uvloop is not None:
+                asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+            asyncio.run(self.serve())
+        else:
+            self.accept_loop()
+
+        log.info("Worker exiting (max requests reached).")
+
+    def accept_loop(self):
+        if len(self.sockets) == 1:
+            # One listener: a blocking accept() wakes exactly one waiting worker per connection
+            self.accept_blocking(self.sockets[0])
+            return
+
+        # Several listening sockets, possibly shared with other workers (--queues), so wait on all of
+        # them and accept without blocking: another worker can take a connection between the wakeup
+        # and accept()
+        listeners = {}
+        for s in self.sockets:
+            s.setblocking(False)
+            listeners[s.fileno()] = (s, self.server_address(s))
+        wait = self.make_waiter(listeners)
+
+        # Accept at most accept_budget connections per socket and wakeup, then go back to waiting:
+        # draining a whole backlog at once would starve the worker's other sockets and keep
+        # connections queued here that an idle worker could have taken
+        accept_budget = max(1, self.options.accept_budget)
+        while self.requests_processed < self.options.max_requests:
+            for fd in wait():
+                sock, server_address = listeners[fd]
+                for _ in range(accept_budget):
+                    if self.requests_processed >= self.options.max_requests:
+                        break
+                    try:
+                        client, addr = sock.accept()
+                    except socket.error as e:
+                        if e.errno in (errno.ECONNABORTED, errno.EPROTO):
+                            continue
+                        if e.errno == errno.EAGAIN:
+                            break
+                        raise
+                    client.setblocking(True)
+                    self.serve_connection(client, addr, server_address)
+
+    def accept_blocking(self, sock):
+        server_address = self.server_address(sock)
+        sock.setblocking(True)
         while self.requests_processed < self.options.max_requests:
             try:
-                client, addr = self.sockets[0].accept() # simplified to one socket
-                self.requests_processed += 1
-                handler = RequestHandler(self.app, client, addr, self.options, self.sockets)
-                handler.handle()
+                client, addr = sock.accept()
             except socket.error as e:
-                if e.errno in (errno.EAGAIN, errno.ECONNABORTED, errno.EPROTO):
+                if e.errno in (errno.ECONNABORTED, errno.EPROTO):
                     continue
                 raise
+            self.serve_connection(client, addr, server_address)
+
+    def make_waiter(self, listeners):
+        # Returns a function that waits up to a second and returns the fds of the ready listeners.
+        # With EPOLLEXCLUSIVE (Linux 4.5+) a connection on a shared socket wakes one of the workers
+        # waiting on it instead of all of them
+        if hasattr(select, 'EPOLLEXCLUSIVE'):
+            ep = select.epoll()
+            try:
+                for fd in listeners:
+                    ep.register(fd, select.EPOLLIN | select.EPOLLEXCLUSIVE)
+            except OSError:
+                ep.close()
+            else:
+                return lambda: [fd for fd, _ in ep.poll(1.0)]
+        sel = selectors.DefaultSelector()
+        for fd in listeners:
+            sel.register(fd, selectors.EVENT_READ)
+        return lambda: [key.fd for key, _ in sel.select(timeout=1.0)]
+
+    def serve_connection(self, client, addr, server_address):
+        self.requests_processed += 1
+        handler = self.get_handler(client, addr, server_address)
+        handler.handle()
+        self.handler_pool.append(handler)
+
+    async def serve(self):
+        # One event loop serves every connection of this worker; the WSGI app itself still runs
+        # synchronously on it, so this helps with idle keep-alive and slow clients, not slow apps
+        loop = asyncio.get_running_loop()
+        self.finished = loop.create_future()
+        for s in self.sockets:
+            protocol = functools.partial(HttpProtocol, self, self.server_address(s))
+            self.servers.append(await loop.create_server(protocol, sock=s, backlog=self.options.backlog))
+        await self.finished
+
+    def connection_made(self, protocol):
+        self.connections.add(protocol)
+        self.requests_processed += 1
+        if self.requests_processed >= self.options.max_requests and not self.draining:
+            # Stop accepting and close idle keep-alive connections; the rest close after their
+            # current request, and the worker exits once none are left
+            self.draining = True
+            for server in self.servers:
+                server.close()
+            for conn in list(self.connections):
+                if conn is not protocol and not conn.handler.in_message:
+                    conn.transport.close()
+
+    def connection_lost(self, protocol):
+        self.connections.discard(protocol)
+        self.handler_pool.append(protocol.handler)
+        if self.draining and not self.connections and not self.finished.done():
+            self.finished.set_result(None)
+
+    def get_handler(self, client, addr, server_address):
+        if self.handler_pool:
+            handler = self.handler_pool.pop()
+            handler.reset(client, addr, server_address)
+            return handler
+        return RequestHandler(self.app, client, addr, self.options, self.sockets, server_address)
 
-        print(f"[{self.pid}] Worker exiting (max requests reached).")
+    def server_address(self, sock):
+        # The listener's address serves every connection accepted on it, unless it is bound to a
+        # wildcard address and only the connection knows which local address it came in on
+        name = sock.getsockname()
+        if not isinstance(name, tuple):
+            return (name, '')
+        if name[0] in ('0.0.0.0', '::'):
+            return None
+        return (name[0], str(name[1]))
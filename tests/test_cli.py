@@ -1,8 +1,20 @@
 import unittest
 import os
+import io
+import contextlib
 import subprocess
 import sys
 
+# cli.py imports CodEyeEngine as a top-level module, as it does when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from src.cli import main, _parse_argv, _build_parser
+# The starman sample package lives under src/output_files/path/to
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'output_files', 'path', 'to'))
+try:
+    import httptools
+except ImportError:
+    httptools = None
+
 class TestCli(unittest.TestCase):
     def setUp(self):
         self.cli_path = os.path.join(os.path.dirname(__file__), '..', 'src', 'cli.py')
@@ -17,7 +29,22 @@ class TestCli(unittest.TestCase):
         if os.path.exists(self.output_file):
             os.remove(self.output_file)
 
+    def test_main_in_process(self):
+        # cli.py always writes into src/output_files, under the base name of -o
+        output_file = os.path.join(os.path.dirname(__file__), '..', 'src', 'output_files', 'test_cli_output.md')
+        self.addCleanup(lambda: os.path.exists(output_file) and os.remove(output_file))
+        buf = io.StringIO()
+        with contextlib.redirect_stdout(buf), contextlib.redirect_stderr(buf):
+            with self.assertRaises(SystemExit) as cm:
+                main([self.test_dir, '-o', self.output_file, '--quiet'])
+        output = buf.getvalue()
+        self.assertEqual(cm.exception.code, 0, output)
+        self.assertIn('Output written to', output)
+        with open(output_file, 'r', encoding='utf-8') as f:
+            self.assertTrue(len(f.read().strip()) > 0)
+
     def test_cli_runs_and_creates_output(self):
+        # End-to-end smoke test through a fresh interpreter
         # Use a minimal directory (the src dir itself) for a quick test
         args = [sys.executable, self.cli_path, self.test_dir, '-o', self.output_file, '--quiet']
         result = subprocess.run(args, capture_output=True, text=True)
@@ -31,5 +58,72 @@ class TestCli(unittest.TestCase):
             content = f.read()
         self.assertTrue(len(content.strip()) > 0)
 
+class TestParseArgv(unittest.TestCase):
+    # The fast argv scanner may hand any command line back to argparse, but whatever it parses
+    # itself has to come out exactly as parse_known_args would have it
+    def assertMatchesArgparse(self, argv):
+        parsed = _parse_argv(argv)
+        self.assertIsNotNone(parsed, argv)
+        args, unknown = parsed
+        expected, expected_unknown = _build_parser().parse_known_args(argv)
+        self.assertEqual(vars(args), vars(expected), argv)
+        self.assertEqual(unknown, expected_unknown, argv)
+
+    def test_matches_argparse(self):
+        for argv in (
+            ["proj"],
+            ["proj", "-o", "out.md", "--quiet", "--use-cache"],
+            ["proj", "--provider", "openai", "-m", "gpt-4o", "--parallel-chunks", "3"],
+            ["proj", "--model=gpt-4o", "--exclude=*.test.ts", "--prompt-cache"],
+            ["proj", "convert", "to", "rust", "--ignore-gitignore"],
+            ["--quiet", "proj", "-s", "Describe it"],
+        ):
+            self.assertMatchesArgparse(argv)
+
+    def test_falls_back_to_argparse(self):
+        for argv in (
+            [],
+            ["proj", "--"],
+            ["proj", "-m", "-x"],
+            ["proj", "--provider", "foo"],
+            ["proj", "--parallel-chunks", "many"],
+            ["proj", "--quiet=1"],
+            ["proj", "--qui"],
+            ["proj", "--help"],
+        ):
+            self.assertIsNone(_parse_argv(argv), argv)
+
+@unittest.skipIf(httptools is None, "httptools is not installed")
+class TestStarmanParseArgv(unittest.TestCase):
+    def assertMatchesArgparse(self, argv):
+        from starman.cli import _parse_argv as parse_argv, _build_parser as build_parser
+        args = parse_argv(argv)
+        self.assertIsNotNone(args, argv)
+        self.assertEqual(vars(args), vars(build_parser().parse_args(argv)), argv)
+
+    def test_matches_argparse(self):
+        for argv in (
+            ["app:app"],
+            ["app:app", "-w", "3", "--preload-app", "--max-requests", "50"],
+            ["app:app", "--workers=3", "--io-backend=asyncio"],
+            ["app:app", "-l", "127.0.0.1:5000", "-l", "/tmp/starman.sock", "--listen=[::1]:5001"],
+            ["--reuseport", "app:app", "--disable-proctitle"],
+        ):
+            self.assertMatchesArgparse(argv)
+
+    def test_falls_back_to_argparse(self):
+        from starman.cli import _parse_argv as parse_argv
+        for argv in (
+            [],
+            ["app:app", "--", "other:app"],
+            ["app:app", "-l", "-x"],
+            ["app:app", "--io-backend", "uring"],
+            ["app:app", "-w", "three"],
+            ["app:app", "--daemonize=yes"],
+            ["app:app", "other:app"],
+            ["app:app", "--version"],
+        ):
+            self.assertIsNone(parse_argv(argv), argv)
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+import os
+import sys
+import tempfile
+
+# CodEyeEngine imports md_to_files and md_to_pdf as top-level modules, as it does when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from CodEyeEngine import _iter_files, chunk_files_for_token_limit, condense_chunk_output, estimate_token_count
+
+class TestIterFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        files = {
+            ".gitignore": "ignored.py\n/build2/\n*.log\n!keep.log\n",
+            "sub/.gitignore": "secret.txt\n/local.py\n",
+            "main.py": "", "ignored.py": "", "a.log": "", "keep.log": "",
+            "build2/x.py": "", "sub/ok.py": "", "sub/secret.txt": "", "sub/local.py": "",
+            "sub/deep/local.py": "", "sub/deep/secret.txt": "",
+        }
+        for rel_path, content in files.items():
+            path = os.path.join(self.root, rel_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(content)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def walk(self, gitignore_rules):
+        return sorted(rel_path.replace(os.sep, "/") for rel_path, _ in _iter_files(self.root, None, gitignore_rules))
+
+    def test_honors_root_and_nested_gitignore(self):
+        self.assertEqual(self.walk(()), ["keep.log", "main.py", "sub/deep/local.py", "sub/ok.py"])
+
+    def test_ignore_gitignore_keeps_every_file(self):
+        self.assertIn("ignored.py", self.walk(None))
+        self.assertIn("sub/deep/secret.txt", self.walk(None))
+
+class TestChunkFilesForTokenLimit(unittest.TestCase):
+    def setUp(self):
+        tokens = {
+            "a/one.py": 40, "a/two.py": 30, "a/three.py": 20,
+            "b/one.py": 50, "b/two.py": 25,
+            "c/huge.py": 500, "root.py": 10,
+        }
+        self.file_info = {os.path.join(*path.split("/")): (n * 4, n) for path, n in tokens.items()}
+
+    def test_chunks_stay_within_max_tokens(self):
+        chunks, _ = chunk_files_for_token_limit(self.file_info, 100)
+        self.assertEqual(sorted(f for chunk in chunks for f in chunk), sorted(self.file_info))
+        for chunk in chunks:
+            used = sum(self.file_info[f][1] for f in chunk)
+            if used > 100:
+                # Only a file larger than the limit on its own may exceed it, and it gets a chunk to itself
+                self.assertEqual(chunk, [os.path.join("c", "huge.py")])
+
+    def test_total_tokens(self):
+        _, total_tokens = chunk_files_for_token_limit(self.file_info, 100)
+        self.assertEqual(total_tokens, sum(tokens for _, tokens in self.file_info.values()))
+
+    def test_whole_codebase_in_one_chunk_when_it_fits(self):
+        chunks, _ = chunk_files_for_token_limit(self.file_info, 10000)
+        self.assertEqual(chunks, [sorted(self.file_info)])
+
+    def test_groups_files_by_top_level_directory(self):
+        a_x, b_y, b_z = os.path.join("a", "x.py"), os.path.join("b", "y.py"), os.path.join("b", "z.py")
+        file_info = {a_x: (280, 70), b_y: (240, 60), b_z: (100, 25)}
+        chunks, _ = chunk_files_for_token_limit(file_info, 100)
+        # z.py fits more tightly next to x.py, but goes with y.py from its own directory
+        self.assertEqual(chunks, [[a_x], [b_y, b_z]])
+
+class TestCondenseChunkOutput(unittest.TestCase):
+    def test_short_output_is_unchanged(self):
+        text = "# Overview\nA small service."
+        self.assertEqual(condense_chunk_output(text, max_tokens=100), text)
+
+    def test_keeps_headings_first_sentences_and_file_paths(self):
+        section = "## Module {0}\nModule {0} parses input. " + "It does many things. " * 20 + "\n```python\n# pkg/mod{0}.py\n" + "x = 1\n" * 50 + "```\n"
+        text = "# Architecture\n" + "".join(section.format(i) for i in range(5))
+        summary = condense_chunk_output(text, max_tokens=200)
+        self.assertLessEqual(estimate_token_count(summary), 200)
+        self.assertIn("# Architecture", summary)
+        self.assertIn("## Module 3", summary)
+        self.assertIn("Module 3 parses input.", summary)
+        self.assertIn("# pkg/mod3.py", summary)
+        self.assertNotIn("x = 1", summary)
+
+    def test_stays_within_max_tokens(self):
+        for text in ("no structure at all " * 2000, "# Heading\nSentence one. Two.\n" * 2000, "line\n" * 5000):
+            summary = condense_chunk_output(text, max_tokens=150)
+            self.assertLessEqual(estimate_token_count(summary), 150)
+            self.assertTrue(summary)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -37,6 +37,40 @@ This is a test.
         self.assertEqual(blocks[0][0], "test_dir/test_file.py")
         self.assertIn("hello world", blocks[0][1])
 
+    def test_extract_file_blocks_skips_blocks_without_path(self):
+        content = """
+```mermaid
+graph TD
+```
+# Not a file
+```python
+# pkg/main.py
+x = 1
+```
+"""
+        blocks = Md2FilesConvertor.extract_file_blocks(content)
+        self.assertEqual(blocks, [("pkg/main.py", "x = 1\n", "python")])
+
+    def test_extract_file_blocks_language_with_symbols(self):
+        content = """
+```c++
+# src/main.cpp
+int main() {}
+```
+```objective-c
+# src/app.m
+@end
+```
+"""
+        blocks = Md2FilesConvertor.extract_file_blocks(content)
+        self.assertEqual([(path, lang) for path, _, lang in blocks],
+                         [("src/main.cpp", "c++"), ("src/app.m", "objective-c")])
+
+    def test_extract_file_blocks_ignores_inline_backticks(self):
+        content = "Use ``` fences.\n```python\n# a.py\nx = 1\n```\n"
+        blocks = Md2FilesConvertor.extract_file_blocks(content)
+        self.assertEqual(blocks, [("a.py", "x = 1\n", "python")])
+
     def test_convert_creates_files(self):
         Md2FilesConvertor.convert(self.test_md_path, output_dir=self.output_dir)
         self.assertTrue(os.path.exists(os.path.join(self.output_dir, "test_dir/test_file.py")))
@@ -0,0 +1,85 @@
+import unittest
+import os
+import sys
+import socket
+import threading
+import time
+
+# The starman sample package lives under src/output_files/path/to
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'output_files', 'path', 'to'))
+try:
+    import httptools
+except ImportError:
+    httptools = None
+
+REQUEST_HEAD = b"POST /upload HTTP/1.1\r\nHost: localhost\r\nContent-Length: 10\r\n\r\nhello"
+REQUEST_TAIL = b"world"
+
+def echo_app(environ, start_response):
+    body = environ['wsgi.input'].read()
+    start_response("200 OK", [("Content-Length", str(len(body)))])
+    return [body]
+
+class FakeTransport:
+    def __init__(self):
+        self.written = []
+        self.closed = False
+
+    def write(self, data):
+        self.written.append(bytes(data))
+
+    def writelines(self, buffers):
+        self.written.extend(bytes(b) for b in buffers)
+
+    def close(self):
+        self.closed = True
+
+    def get_extra_info(self, name):
+        return ('127.0.0.1', 5000) if name == 'sockname' else ('127.0.0.1', 40000)
+
+@unittest.skipIf(httptools is None, "httptools is not installed")
+class TestDisableKeepalive(unittest.TestCase):
+    def setUp(self):
+        from starman.cli import _parse_argv
+        self.options = _parse_argv(['app:app', '--disable-keepalive'])
+
+    def test_asyncio_protocol_waits_for_the_whole_request(self):
+        from starman.worker import Worker, HttpProtocol
+        worker = Worker(echo_app, self.options, [])
+        protocol = HttpProtocol(worker, ('127.0.0.1', '5000'))
+        transport = FakeTransport()
+        protocol.connection_made(transport)
+        protocol.data_received(REQUEST_HEAD)
+        self.assertFalse(transport.closed)
+        protocol.data_received(REQUEST_TAIL)
+        self.assertTrue(transport.closed)
+        response = b''.join(transport.written)
+        self.assertTrue(response.startswith(b"HTTP/1.1 200 OK\r\n"))
+        self.assertTrue(response.endswith(b"\r\n\r\nhelloworld"))
+
+    def test_select_handler_waits_for_the_whole_request(self):
+        from starman.worker import RequestHandler
+        server, client = socket.socketpair()
+        self.addCleanup(client.close)
+        client.sendall(REQUEST_HEAD)
+
+        def send_tail():
+            time.sleep(0.1)
+            client.sendall(REQUEST_TAIL)
+
+        sender = threading.Thread(target=send_tail)
+        sender.start()
+        RequestHandler(echo_app, server, '', self.options, [], ('127.0.0.1', '5000')).handle()
+        sender.join()
+        client.settimeout(2)
+        response = b''
+        while True:
+            data = client.recv(65536)
+            if not data:
+                break
+            response += data
+        self.assertTrue(response.startswith(b"HTTP/1.1 200 OK\r\n"))
+        self.assertTrue(response.endswith(b"\r\n\r\nhelloworld"))
+
+if __name__ == "__main__":
+    unittest.main()